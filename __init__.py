@@ -1,8 +1,13 @@
+import os
+import secrets
+
 from flask import Flask
 from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 
+from model.storage import initStorage
+
 """
 These object can be used throughout project.
 1.) Objects from this file can be included in many blueprints
@@ -12,14 +17,78 @@ These object can be used throughout project.
 # Setup of key Flask object (app)
 app = Flask(__name__)
 # Setup SQLAlchemy object and properties for the database (db)
-dbURI = 'sqlite:///volumes/sqlite.db'
+dbURI = os.environ.get('DATABASE_URI', 'sqlite:///volumes/sqlite.db')  # override to run against another database
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_DATABASE_URI'] = dbURI
-app.config['SECRET_KEY'] = 'SECRET_KEY'
+# SECRET_KEY signs login tokens and must be the same in every worker, a public default would let anyone sign one
+# -- required, FLASK_DEBUG=1 (development server, benchmarks) falls back to a random key of this process
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+if not app.config['SECRET_KEY']:
+    if os.environ.get('FLASK_DEBUG', '0').lower() in ('0', 'false', ''):
+        raise RuntimeError("SECRET_KEY is not set, export a long random value (or FLASK_DEBUG=1 for development)")
+    app.config['SECRET_KEY'] = secrets.token_hex(32)
+app.config['API_MAX_LIMIT'] = 1000  # largest page a list endpoint returns for ?limit=
+app.config['STREAM_BATCH_SIZE'] = 500  # rows fetched and serialized per chunk of a ?stream=1 response
+app.config['BULK_BATCH_SIZE'] = 500  # rows per executemany of a /bulk endpoint, ?batch= overrides
+app.config['BULK_MAX_BATCH_SIZE'] = 5000  # largest ?batch=
+app.config['QUERY_DEBUG_HEADERS'] = False  # X-Query-Count/X-Query-Time headers, always on in debug mode
+app.config['WARM_BOOT'] = os.environ.get('WARM_BOOT', '1') != '0'  # create schema and seed data when the server starts
+app.config['STORAGE_PROFILE'] = os.environ.get('STORAGE_PROFILE', 'concurrent')  # 'compat' keeps SQLite defaults
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 8))  # open connections per worker, one per thread
+app.config['DB_POOL_OVERFLOW'] = 8  # extra connections opened under load, closed when returned
+initStorage(app)  # pragmas and pool of the storage profile, see model/storage.py
 db = SQLAlchemy()
+db.init_app(app)
 Migrate(app, db)
+login_manager = LoginManager(app)  # request users from signed tokens, see model/auth.py
 
 # Images storage
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # maximum size of uploaded content
 app.config['UPLOAD_EXTENSIONS'] = ['.jpg', '.png', '.gif']  # supported file types
 app.config['UPLOAD_FOLDER'] = 'volumes/uploads/'  # location of user uploaded content
+app.config['IMAGE_CACHE_BYTES'] = 32 * 1024 * 1024  # memory cap for encoded images shared by all posts
+app.config['IMAGE_DELIVERY'] = 'reference'  # 'reference' returns image URLs in posts, 'inline' returns base64
+app.config['UPLOAD_URL'] = '/uploads'  # URL prefix serving uploaded content
+
+# Encoded responses of versioned GET endpoints are cached by endpoint, query args and table versions
+app.config['RESPONSE_CACHE_BYTES'] = int(os.environ.get('RESPONSE_CACHE_BYTES', 64 * 1024 * 1024))  # memory cap per worker
+
+# Prometheus metrics on /metrics, each worker writes its values to METRICS_DIR and a scrape sums them
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', 'volumes/metrics')
+app.config['METRICS_WRITE_INTERVAL'] = 5  # seconds between writes of a worker's values
+
+# Skin type routines are cached serialized, by skin type
+app.config['SKINTYPE_CACHE_BYTES'] = 1024 * 1024  # memory cap of the routine cache
+
+# Similar clients by shared ingredients, the neighbour table keeps SIMILAR_MAX_K clients per product
+app.config['SIMILAR_MAX_K'] = 50  # largest k of /api/clients/<id>/similar
+app.config['SIMILAR_PRECOMPUTE'] = True  # fill the whole neighbour table in the background once built
+
+# Passwords are hashed and checked in a process pool, requests beyond workers + queue get 503 with Retry-After
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')  # older hashes are upgraded at login
+app.config['PASSWORD_POOL_WORKERS'] = int(os.environ.get('PASSWORD_POOL_WORKERS', os.cpu_count() or 1))  # 0 hashes in the request thread
+app.config['PASSWORD_POOL_QUEUE'] = 16  # hashes waiting for a worker before requests are turned away
+app.config['PASSWORD_RETRY_AFTER'] = 1  # seconds, Retry-After of a busy response
+
+# Player leaderboard, the top LEADERBOARD_SIZE players are kept in memory per worker
+app.config['LEADERBOARD_SIZE'] = 1000  # largest ?n= of /api/players/leaderboard
+
+# Login tokens, signed with SECRET_KEY, sent as Authorization: Bearer <token> or in the AUTH_COOKIE cookie
+app.config['AUTH_TOKEN_TTL'] = 3600  # seconds a token is accepted
+app.config['AUTH_REVOCATION_REFRESH'] = 1.0  # seconds before a worker sees revocations made by another worker
+app.config['AUTH_COOKIE'] = 'auth_token'
+app.config['ADMIN_UIDS'] = {uid for uid in os.environ.get('ADMIN_UIDS', '').split(',') if uid}  # uids allowed on /api/admin
+
+# Joke votes are counted in memory and written to the jokes table in batches
+app.config['JOKE_VOTES_FLUSH_INTERVAL'] = 1.0  # seconds between flushes
+app.config['JOKE_VOTES_FLUSH_THRESHOLD'] = 1000  # pending votes that trigger an early flush
+
+# COVID proxy, upstream RapidAPI responses are kept for COVID_TTL and served stale for COVID_STALE more seconds
+app.config['COVID_API_URL'] = 'https://corona-virus-world-and-india-data.p.rapidapi.com/api'
+app.config['COVID_API_HOST'] = 'corona-virus-world-and-india-data.p.rapidapi.com'
+app.config['COVID_API_KEY'] = os.environ.get('COVID_API_KEY', 'dec069b877msh0d9d0827664078cp1a18fajsn2afac35ae063')
+app.config['COVID_API_TIMEOUT'] = 10  # seconds to wait for upstream
+app.config['COVID_TTL'] = 86400  # refresh every 24 hours
+app.config['COVID_STALE'] = 86400  # serve an expired response for up to one more day while refreshing
+app.config['COVID_BACKOFF'] = 60  # seconds before retrying a failed refresh, doubled per failure
+app.config['COVID_SNAPSHOT'] = 'volumes/covid_snapshot.json.gz'  # last good response, loaded at start up
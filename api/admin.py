@@ -0,0 +1,27 @@
+from flask import Blueprint
+from flask_restful import Api, Resource # used for REST API building
+
+from api.conditional import response_cache
+from model.auth import admin_required
+from model.images import image_cache
+from model.skintypes import routine_cache
+
+admin_api = Blueprint('admin_api', __name__,
+                   url_prefix='/api/admin')
+
+# API docs https://flask-restful.readthedocs.io/en/latest/api.html
+api = Api(admin_api)
+
+class AdminAPI:
+    # statistics of the in-process caches of this worker: entries, bytes, hits, misses, evictions and hit rate
+    # -- admins only (ADMIN_UIDS), the same values are exported without detail on /metrics
+    class _Caches(Resource):
+        method_decorators = [admin_required]
+
+        def get(self):
+            return {"responses": response_cache.stats(),
+                    "routines": routine_cache.stats(),
+                    "images": image_cache.stats()}
+
+    # building RESTapi endpoint
+    api.add_resource(_Caches, '/caches')
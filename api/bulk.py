@@ -0,0 +1,112 @@
+""" bulk create endpoints, many rows per request inserted in batches inside one transaction
+
+Request body of a /bulk endpoint
+    a JSON array of objects, or NDJSON (Content-Type application/x-ndjson) with one object per line
+    ?batch= rows per executemany, BULK_BATCH_SIZE when missing
+The response has a status per row, {"row": 0, "status": "created"} or {"row": 1, "status": "error", "message": ...},
+an invalid row is skipped and the other rows are still created. All rows are committed at once.
+"""
+import json
+
+from flask import request, jsonify
+from flask_restful import abort
+from sqlalchemy.exc import IntegrityError
+
+from __init__ import app, db
+from api.pagination import intArg
+from model.shared import bumpVersions
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+
+# raised by a validate function for a row that can not be created
+class RowError(ValueError):
+    pass
+
+
+# text of row[key] with at least minimum characters, default when missing and default is given
+def textField(row, key, label, minimum=2, default=None):
+    value = row.get(key, default)
+    if not isinstance(value, str) or len(value) < minimum:
+        raise RowError(f'{label} is missing, or is less than {minimum} characters')
+    return value
+
+
+# (row number, object) of each row of the request body, NDJSON is parsed a line at a time while it is read
+# a row that is not valid JSON is None
+def bulkRows():
+    if request.mimetype in NDJSON_TYPES:
+        number = 0
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row
+            number += 1
+        return
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        abort(400, message='Body must be a JSON array, or NDJSON with Content-Type application/x-ndjson')
+    yield from enumerate(rows)
+
+
+# create rows of model from the request body, returns the per row status response
+# -- validate(row) returns the column values of one object, or raises RowError
+# -- prepare(values) completes a batch of valid column values before it is inserted, e.g. hashes passwords
+# -- unique is a column that must not repeat in the body or the table, e.g. '_uid'
+# -- committed() runs after rows were created, e.g. to invalidate caches of model
+def bulkCreate(model, validate, prepare=None, unique=None, committed=None):
+    batch_size = min(intArg('batch', 1) or app.config['BULK_BATCH_SIZE'], app.config['BULK_MAX_BATCH_SIZE'])
+    statuses = []
+    batch = []  # (row number, column values)
+    seen = set()  # unique values of the body so far
+
+    def insert():
+        if unique is not None:
+            column = getattr(model, unique)
+            existing = {value for (value,) in db.session.query(column).filter(column.in_([values[unique] for _, values in batch]))}
+            for number, values in batch:
+                if values[unique] in existing:
+                    statuses.append({"row": number, "status": "error", "message": f"{values[unique]} already exists"})
+            batch[:] = [(number, values) for number, values in batch if values[unique] not in existing]
+        if not batch:
+            return
+        if prepare is not None:
+            prepare([values for _, values in batch])
+        db.session.execute(model.__table__.insert(), [values for _, values in batch])  # one executemany
+        bumpVersions(db.session, model.__tablename__)  # Core inserts are not seen by the session events
+        statuses.extend({"row": number, "status": "created"} for number, _ in batch)
+        batch.clear()
+
+    try:
+        for number, row in bulkRows():
+            try:
+                if not isinstance(row, dict):
+                    raise RowError('Row must be a JSON object')
+                values = validate(row)
+                if unique is not None:
+                    if values[unique] in seen:
+                        raise RowError(f'{values[unique]} is repeated')
+                    seen.add(values[unique])
+            except RowError as error:
+                statuses.append({"row": number, "status": "error", "message": str(error)})
+                continue
+            batch.append((number, values))
+            if len(batch) >= batch_size:
+                insert()
+        insert()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return {'message': 'Rows conflict with rows created at the same time, nothing was created'}, 409
+    except BaseException:
+        db.session.rollback()
+        raise
+    statuses.sort(key=lambda status: status["row"])
+    created = sum(1 for status in statuses if status["status"] == "created")
+    if created and committed is not None:
+        committed()
+    return jsonify({"created": created, "failed": len(statuses) - created, "rows": statuses})
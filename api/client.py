@@ -2,7 +2,11 @@ from flask import Blueprint, request, jsonify
 from flask_restful import Api, Resource # used for REST API building
 from datetime import datetime
 
-from model.clients import Client
+from __init__ import app
+from model.clients import Client, getIngredientIndex, getSimilarityIndex, invalidateClientIndexes
+from api.bulk import RowError, bulkCreate, textField
+from api.conditional import versioned
+from api.pagination import intArg, pageArgs, pageQuery, projectQuery, nextCursor, pageResponse
 
 client_api = Blueprint('client_api', __name__,
                    url_prefix='/api/clients')
@@ -43,12 +47,73 @@ class ClientAPI:
             # failure returns error
             return {'message': f'Processed {product}, either a format error or User ID {skinType} is duplicate'}, 210
 
+    # many clients in one request, a JSON array or NDJSON, see api/bulk.py
+    class _Bulk(Resource):
+        def post(self):
+            def validate(row):
+                date = row.get('date', '')
+                if not isinstance(date, str):
+                    raise RowError('Date must be text')
+                return {"_product": textField(row, 'product', 'Product'),
+                        "_ingredients": textField(row, 'ingredients', 'Ingredients', minimum=1),
+                        "_skinType": textField(row, 'skinType', 'Skin type'),
+                        "_date": date}
+            # rows bypass Client.create, the client indexes are rebuilt on next use
+            return bulkCreate(Client, validate, committed=invalidateClientIndexes)
+
     class _Read(Resource):
+        @versioned('clients', 'tosts')  # 304 or cached bytes when unchanged, see api/conditional.py
         def get(self):
-            clients = Client.query.all()    # read/extract all users from database
-            json_ready = [client.read() for client in clients]  # prepare output in json
-            return jsonify(json_ready)  # jsonify creates Flask response object, more specific to APIs than json.dumps
+            fields, limit, after = pageArgs(Client)  # ?limit=&after=&fields= narrow the page
+            # read/extract clients from database, only requested columns, tosts in one extra SELECT
+            clients = pageQuery(Client, fields, limit, after)
+            inline = request.args.get('inline', '').lower() in ('1', 'true')  # opt-in base64 images
+            read = lambda client: client.read(inline or None, fields)  # prepare output in json
+            return pageResponse(clients, read, nextCursor(Client, limit, after))  # jsonify or stream with next page cursor
+
+    # search by ingredients with the inverted index, e.g. /search?all=niacinamide,glycerin&not=fragrance&skinType=oily
+    # all, any and not are comma separated ingredients, skinType is comma separated skin types, any one matches
+    class _Search(Resource):
+        def get(self):
+            terms = {name: [term for term in request.args.get(name, '').split(',') if term.strip()]
+                     for name in ('all', 'any', 'not', 'skinType')}
+            if not any(terms.values()):
+                return {'message': 'Search needs at least one of all, any, not or skinType'}, 400
+            fields, limit, after = pageArgs(Client)  # ?limit=&after=&fields= narrow the page
+            limit = limit or app.config['API_MAX_LIMIT']  # matches are paged, never loaded all at once
+            index = getIngredientIndex()
+            found = index.search(terms['all'], terms['any'], terms['not'], terms['skinType'])
+            # one more id than the page tells whether a next page exists, only the page rows are loaded
+            ids = index.page(found, limit + 1, after)
+            cursor = ids[limit - 1] if len(ids) > limit else None
+            ids = ids[:limit]
+            clients = projectQuery(Client, fields).filter(Client.id.in_(ids)).order_by(Client.id)
+            inline = request.args.get('inline', '').lower() in ('1', 'true')  # opt-in base64 images
+            read = lambda client: client.read(inline or None, fields)  # prepare output in json
+            return pageResponse(clients, read, cursor)  # jsonify or stream with next page cursor
+
+    # clients with the most ingredients in common, e.g. /3/similar?k=10&metric=jaccard, best first with their score
+    class _Similar(Resource):
+        def get(self, id):
+            metric = request.args.get('metric', 'cosine')
+            if metric not in ('cosine', 'jaccard'):
+                return {'message': f'Unknown metric {metric}, choose from cosine, jaccard'}, 400
+            k = intArg('k', 1) or 10
+            if k > app.config['SIMILAR_MAX_K']:
+                return {'message': f"k must be at most {app.config['SIMILAR_MAX_K']}"}, 400
+            fields = pageArgs(Client)[0]  # ?fields= narrows each client
+            similar = getSimilarityIndex(metric).similar(id, k)
+            if similar is None:
+                return {'message': f'Client {id} not found'}, 404
+            scores = dict(similar)
+            rank = {client_id: position for position, (client_id, _) in enumerate(similar)}
+            clients = projectQuery(Client, fields).filter(Client.id.in_(scores)).all()
+            clients.sort(key=lambda client: rank[client.id])
+            return jsonify([{**client.read(None, fields), "score": scores[client.id]} for client in clients])
 
     # building RESTapi endpoint
     api.add_resource(_Create, '/create')
-    api.add_resource(_Read, '/')
\ No newline at end of file
+    api.add_resource(_Bulk, '/bulk')
+    api.add_resource(_Read, '/')
+    api.add_resource(_Search, '/search')
+    api.add_resource(_Similar, '/<int:id>/similar')
\ No newline at end of file
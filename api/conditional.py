@@ -0,0 +1,65 @@
+""" conditional and cached GET, keyed by the versions of the tables a response is read from
+
+A GET handler decorated with versioned('users', 'posts') answers If-None-Match with 304 Not Modified after one
+SELECT of the table versions, before any row is loaded. Versions are bumped by every committed change, by any
+worker, and are kept in the database, so an ETag stays valid across restarts, see model/shared.py.
+
+Other requests are answered from response_cache, the encoded body and headers of earlier 200 responses by
+endpoint, path and query args at the same versions. A commit of this process drops the entries of the tables
+it changed, an entry of another worker's older version is never matched and ages out of the LRU.
+"""
+import functools
+
+from flask import Response, request
+
+from __init__ import app
+from model.cache import LRUCache
+from model.shared import commit_listeners, tableVersions
+
+response_cache = LRUCache(app.config['RESPONSE_CACHE_BYTES'])
+
+
+# drop cached responses read from any of tables
+def dropResponses(tables):
+    return response_cache.discard(lambda key: not tables.isdisjoint(key[0]))
+
+
+commit_listeners.append(dropResponses)
+
+
+# ETag of the current versions of tables, e.g. "1843-12-3", the epoch of the database first
+def versionTag(tables):
+    versions = tableVersions(('epoch',) + tables)
+    return '-'.join(str(versions[name]) for name in ('epoch',) + tables)
+
+
+# decorator of a Resource get method whose response only changes with tables
+# -- versions are read before the handler runs, a change committed meanwhile gets a new ETag on the next poll
+# -- only 200 responses are tagged and cached, errors are sent as they are, streamed responses are not cached
+def versioned(*tables):
+    def decorate(get):
+        @functools.wraps(get)
+        def wrapper(*args, **kwargs):
+            etag = versionTag(tables)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                key = (frozenset(tables), request.endpoint, tuple(sorted(request.view_args.items())),
+                       tuple(sorted(request.args.items(multi=True))), etag)
+                cached = response_cache.get(key)
+                if cached is not None:
+                    body, headers = cached
+                    response = Response(body, headers=headers)
+                else:
+                    response = get(*args, **kwargs)
+                    if not isinstance(response, Response) or response.status_code != 200:
+                        return response
+                    if not response.is_streamed:
+                        body = response.get_data()
+                        headers = [(name, value) for name, value in response.headers if name != 'Content-Length']
+                        response_cache.set(key, (body, headers), len(body) + 256)  # headers and key, roughly
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'  # clients revalidate every poll
+            return response
+        return wrapper
+    return decorate
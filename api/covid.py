@@ -1,9 +1,15 @@
-from contextlib import nullcontext
-from flask import Blueprint, jsonify  # jsonify creates an endpoint response object
-from flask_restful import Api, Resource # used for REST API building
-import requests  # used for testing 
+from flask import Blueprint, jsonify, request  # jsonify creates an endpoint response object
+from flask_restful import Api, Resource, abort # used for REST API building
+import math
+import requests  # used for upstream API and testing
+import threading
 import time
 
+from __init__ import app
+from model.cache import RefreshingCache
+from model.countries import CountryIndex
+from model.metrics import observeUpstream
+
 # Blueprints enable python code to be organized in multiple files and directories https://flask.palletsprojects.com/en/2.2.x/blueprints/
 covid_api = Blueprint('covid_api', __name__,
                    url_prefix='/api/covid')
@@ -11,74 +17,113 @@ covid_api = Blueprint('covid_api', __name__,
 # API generator https://flask-restful.readthedocs.io/en/latest/api.html#id1
 api = Api(covid_api)
 
-"""Time Keeper
+"""Upstream Fetch
 Returns:
-    Boolean: is it time to update?
+    Dictionary: parsed API response, raises on timeout, HTTP error or unexpected body
 """
-def updateTime():
-    global last_run  # the last_run global is preserved between calls to function
-    try: last_run
-    except: last_run = None
-    
-    # initialize last_run data
-    if last_run is None:
-        last_run = time.time()
-        return True
-    
-    # calculate time since last update
-    elapsed = time.time() - last_run
-    if elapsed > 86400:  # update every 24 hours
-        last_run = time.time()
-        return True
-    
-    return False
+def fetchCovidAPI():
+    """
+    RapidAPI is the world's largest API Marketplace. 
+    Developers use Rapid API to discover and connect to thousands of APIs. 
+    """
+    headers = {
+        'x-rapidapi-key': app.config['COVID_API_KEY'],
+        'x-rapidapi-host': app.config['COVID_API_HOST']
+    }
+    start, outcome = time.perf_counter(), 'error'
+    try:
+        response = requests.request("GET", app.config['COVID_API_URL'], headers=headers,
+                                    timeout=app.config['COVID_API_TIMEOUT'])
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, dict) or not isinstance(data.get('countries_stat'), list):
+            raise ValueError("COVID API response has no countries_stat")
+        outcome = 'ok'
+        return data
+    finally:
+        observeUpstream('covid', time.perf_counter() - start, outcome)  # latency and outcome on /metrics
+
+
+"""Data Keeper
+Preserve Service usage / speed time with a Reasonable refresh delay,
+requests are answered from the last good response while a background thread refreshes it
+"""
+covid_cache = RefreshingCache(fetchCovidAPI,
+                              ttl=app.config['COVID_TTL'],
+                              stale=app.config['COVID_STALE'],
+                              backoff=app.config['COVID_BACKOFF'],
+                              path=app.config['COVID_SNAPSHOT'])  # shared by all workers, survives restarts
+
 
 """API Handler
 Returns:
-    String: API response
+    Dictionary: API response, raises when no response was ever fetched
 """   
 def getCovidAPI():
-    global covid_data  # the covid_data global is preserved between calls to function
-    try: covid_data
-    except: covid_data = None
+    return covid_cache.get()
 
-    """
-    Preserve Service usage / speed time with a Reasonable refresh delay
-    """
-    if updateTime(): # request Covid data
-        """
-        RapidAPI is the world's largest API Marketplace. 
-        Developers use Rapid API to discover and connect to thousands of APIs. 
-        """
-        url = "https://corona-virus-world-and-india-data.p.rapidapi.com/api"
-        headers = {
-            'x-rapidapi-key': "dec069b877msh0d9d0827664078cp1a18fajsn2afac35ae063",
-            'x-rapidapi-host': "corona-virus-world-and-india-data.p.rapidapi.com"
-        }
-        response = requests.request("GET", url, headers=headers)
-        covid_data = response
-    else:  # Request Covid Data
-        response = covid_data
-
-    return response
+
+"""Country Index Keeper
+Returns:
+    CountryIndex: index of the current API response, built once per refresh
+"""
+country_index = None
+country_index_lock = threading.Lock()
+
+def getCountryIndex():
+    global country_index  # the country_index global is preserved between calls to function
+    response = getCovidAPI()
+    with country_index_lock:
+        if country_index is None or country_index.source is not response:
+            country_index = CountryIndex(response)
+        return country_index
 
 
 """API with Country Filter
 Returns:
-    String: Filter of API response
+    Dictionary: Filter of API response
 """   
 def getCountry(filter):
-    # Request Covid Data
-    response = getCovidAPI()
-    # Look for Country    
-    countries = response.json().get('countries_stat')
-    for country in countries:  # countries is a list
-        if country["country_name"].lower() == filter.lower():  # this filters for country
-            return country
+    # Look for Country, case insensitive dictionary lookup
+    country = getCountryIndex().lookup(filter)
+    if country is not None:
+        return country
     
     return {"message": filter + " not found"}
 
 
+"""Query Argument Checks
+Returns:
+    metric, count and bound arguments of the query endpoints, aborts with 400 when invalid
+"""
+def metricArg(index):
+    metric = request.args.get('metric', 'cases')
+    if metric not in index.metrics():
+        abort(400, message=f"Unknown metric {metric}, choose from {', '.join(index.metrics())}")
+    return metric
+
+def countArg(default=10):
+    try:
+        n = int(request.args.get('n', default))
+    except ValueError:
+        n = 0
+    if n < 1:
+        abort(400, message="n must be a positive integer")
+    return n
+
+def boundArg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        bound = float(value.replace(',', ''))
+    except ValueError:
+        bound = math.nan
+    if not math.isfinite(bound):  # nan and inf parse as floats but bound nothing
+        abort(400, message=f"{name} must be a finite number")
+    return bound
+
+
 """Defines API Resources 
   URLs are defined with api.add_resource
 """   
@@ -86,15 +131,54 @@ class CovidAPI:
     """API Method to GET all Covid Data"""
     class _Read(Resource):
         def get(self):
-            return getCovidAPI().json()
+            try:
+                return getCovidAPI()
+            except Exception:
+                return {'message': 'COVID data is unavailable, try again later'}, 503
         
     """API Method to GET Covid Data for a Specific Country"""
     class _ReadCountry(Resource):
         def get(self, filter):
-            return jsonify(getCountry(filter))
+            try:
+                return jsonify(getCountry(filter))
+            except Exception:
+                return {'message': 'COVID data is unavailable, try again later'}, 503
+    
+    """API Method to GET the top countries by a metric, e.g. /top?metric=cases&n=10&order=asc"""
+    class _ReadTop(Resource):
+        def get(self):
+            try:
+                index = getCountryIndex()
+            except Exception:
+                return {'message': 'COVID data is unavailable, try again later'}, 503
+            ascending = request.args.get('order', 'desc').lower() == 'asc'
+            return jsonify(index.top(metricArg(index), countArg(), ascending))
+
+    """API Method to GET countries with a metric in a range, e.g. /range?metric=deaths&min=1000&max=50000"""
+    class _ReadRange(Resource):
+        def get(self):
+            try:
+                index = getCountryIndex()
+            except Exception:
+                return {'message': 'COVID data is unavailable, try again later'}, 503
+            return jsonify(index.range(metricArg(index), boundArg('min'), boundArg('max')))
+
+    """API Method to GET countries by case insensitive name prefix, close matches when none start with it"""
+    class _ReadSearch(Resource):
+        def get(self):
+            try:
+                index = getCountryIndex()
+            except Exception:
+                return {'message': 'COVID data is unavailable, try again later'}, 503
+            prefix = request.args.get('prefix', '')
+            n = countArg()
+            return jsonify(index.prefix(prefix, n) or index.fuzzy(prefix, n))
     
     # resource is called an endpoint: base usr + prefix + endpoint
     api.add_resource(_Read, '/')
+    api.add_resource(_ReadTop, '/top')
+    api.add_resource(_ReadRange, '/range')
+    api.add_resource(_ReadSearch, '/search')
     api.add_resource(_ReadCountry, '/<string:filter>')
 
 
@@ -105,14 +189,19 @@ if __name__ == "__main__":
     """
     Using this test code is how I built the backend logic around this API.  
     There were at least 10 debugging session, on handling updateTime.
+    Runs against a local stand-in for RapidAPI, see benchmarks/covid_stub.py
     """
+    import time
+    from benchmarks.covid_stub import startStub
+    stub = startStub()
+    app.config['COVID_API_URL'] = stub.url
     
     print("-"*30) # cosmetic separator
 
     # This code looks for "world data"
     response = getCovidAPI()
     print("World Totals")
-    world = response.json().get('world_total')  # turn response to json() so we can extract "world_total"
+    world = response.get('world_total')  # response is parsed json, so we can extract "world_total"
     for key, value in world.items():  # this finds key, value pairs in country
         print(key, value)
 
@@ -125,3 +214,11 @@ if __name__ == "__main__":
         print(key, value)
         
     print("-"*30)
+
+    # Upstream failure keeps serving the last good response, a stale read starts one background refresh
+    stub.status = 500
+    covid_cache.ttl = 0
+    print("Stale read while upstream fails:", getCountry("USA")["cases"])
+    time.sleep(0.5)  # let the background refresh fail
+    print("Cache stats:", covid_cache.stats())
+    stub.shutdown()
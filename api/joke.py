@@ -1,5 +1,5 @@
-from flask import Blueprint, jsonify  # jsonify creates an endpoint response object
-from flask_restful import Api, Resource # used for REST API building
+from flask import Blueprint, jsonify, request  # jsonify creates an endpoint response object
+from flask_restful import Api, Resource, abort # used for REST API building
 import requests  # used for testing 
 import random
 
@@ -39,6 +39,32 @@ class JokesAPI:
             countMsg = {'count': count}
             return jsonify(countMsg)
 
+    # topJokes(by, n), e.g. /top?by=haha&n=5
+    class _ReadTop(Resource):
+        def get(self):
+            by = request.args.get('by', 'haha')
+            if by not in ('haha', 'boohoo'):
+                abort(400, message='by must be haha or boohoo')
+            try:
+                n = int(request.args.get('n', 5))
+            except ValueError:
+                n = 0
+            if n < 1:
+                abort(400, message='n must be a positive integer')
+            return jsonify(topJokes(by, n))
+
+    # rankJoke(id, by)
+    class _ReadRank(Resource):
+        def get(self, id):
+            by = request.args.get('by', 'haha')
+            if by not in ('haha', 'boohoo'):
+                abort(400, message='by must be haha or boohoo')
+            rank = rankJoke(id, by)
+            if rank is None:
+                abort(404, message=f'Joke {id} not found')
+            joke = getJoke(id)
+            return jsonify({'id': id, 'by': by, 'rank': rank, by: joke[by], 'count': countJokes()})
+
     # put method: addJokeHaHa
     class _UpdateLike(Resource):
         def put(self, id):
@@ -57,6 +83,8 @@ class JokesAPI:
     api.add_resource(_ReadID, '/<int:id>')
     api.add_resource(_ReadRandom, '/random')
     api.add_resource(_ReadCount, '/count')
+    api.add_resource(_ReadTop, '/top')
+    api.add_resource(_ReadRank, '/rank/<int:id>')
     api.add_resource(_UpdateLike, '/like/<int:id>')
     api.add_resource(_UpdateJeer, '/jeer/<int:id>')
     
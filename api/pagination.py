@@ -0,0 +1,120 @@
+""" keyset pagination and field projection shared by the list endpoints
+
+Request args of a list endpoint
+    limit   maximum number of rows in the response, all rows when missing
+    after   id of the last row already received, rows with a greater id are returned
+    fields  comma separated read() keys, e.g. fields=id,name
+    stream  1 or true, rows are serialized while the query is iterated in a chunked response
+Responses carry the cursor of the next page in the X-Next-Cursor and Link headers, the Link URL is relative so
+a cached response (api/conditional.py) never hands one client the host or scheme of another.
+"""
+from urllib.parse import urlencode
+
+from flask import Response, json, request, jsonify, stream_with_context
+from flask_restful import abort
+from sqlalchemy.orm import RelationshipProperty, load_only, selectinload
+
+from __init__ import app, db
+
+
+# integer request arg, None when missing, aborts with 400 when invalid
+def intArg(name, minimum):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        value = minimum - 1
+    if value < minimum:
+        abort(400, message=f'{name} must be an integer of at least {minimum}')
+    return value
+
+
+# parse fields, limit and after request args for model
+# returns (fields, limit, after), fields is None when all read() keys are wanted
+def pageArgs(model):
+    fields = None
+    if 'fields' in request.args:
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in model.read_columns]
+        if unknown or len(fields) == 0:
+            abort(400, message=f"Unknown fields {', '.join(unknown)}, choose from {', '.join(model.read_columns)}")
+    limit = intArg('limit', 1)
+    if limit is not None:
+        limit = min(limit, app.config['API_MAX_LIMIT'])
+    after = intArg('after', 0)
+    return fields, limit, after
+
+
+# query for model loading only the columns and relationships that fields are built from
+def projectQuery(model, fields, query=None):
+    query = model.query if query is None else query
+    columns = [model.id]
+    relationships = []
+    for field in (model.read_columns if fields is None else fields):
+        for name in model.read_columns[field]:
+            attribute = getattr(model, name)
+            if isinstance(attribute.property, RelationshipProperty):
+                relationships.append(attribute)
+            else:
+                columns.append(attribute)
+    if fields is not None:
+        query = query.options(load_only(*columns))
+    for relationship in relationships:
+        query = query.options(selectinload(relationship))  # children of all rows in one extra SELECT
+    return query
+
+
+# projected query for one page of model, ordered by id
+def pageQuery(model, fields, limit, after, query=None):
+    query = projectQuery(model, fields, query)
+    if after is not None:
+        query = query.filter(model.id > after)
+    query = query.order_by(model.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+# id to continue after, None on the last page
+# -- looks up the ids at the page boundary only, using the primary key index
+def nextCursor(model, limit, after):
+    if limit is None:
+        return None
+    query = db.session.query(model.id)
+    if after is not None:
+        query = query.filter(model.id > after)
+    ids = query.order_by(model.id).offset(limit - 1).limit(2).all()
+    return ids[0][0] if len(ids) == 2 else None
+
+
+# JSON array of read(row) for every row of query, serialized in chunks while the query is iterated
+# -- yield_per fetches rows in batches, so memory is bounded by one batch whatever the table size
+def streamRows(query, read):
+    batch = app.config['STREAM_BATCH_SIZE']
+    separator = '['
+    chunk = []
+    for row in query.yield_per(batch):
+        chunk.append(separator + json.dumps(read(row), separators=(',', ':')))
+        separator = ','
+        if len(chunk) == batch:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append(']\n' if separator == ',' else '[]\n')
+    yield ''.join(chunk)
+
+
+# list response of read(row) for rows of query, with next page cursor headers
+# -- ?stream=1 streams the rows, otherwise the whole list is built and sent with jsonify
+def pageResponse(query, read, cursor):
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        response = Response(stream_with_context(streamRows(query, read)), mimetype='application/json')
+    else:
+        response = jsonify([read(row) for row in query])
+    if cursor is not None:
+        args = request.args.to_dict()
+        args['after'] = cursor
+        response.headers['X-Next-Cursor'] = str(cursor)
+        response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
@@ -1,7 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flask_restful import Api, Resource # used for REST API building
 
-from model.players import Player
+from __init__ import app
+from model.players import Player, TokenError, UnknownPlayer, addTokens, applyTokens, transferTokens, topPlayers, rankPlayer
+from model.passwords import password_pool
+from api.bulk import RowError, bulkCreate, textField
+from api.conditional import versioned
+from api.pagination import intArg, pageArgs, pageQuery, nextCursor, pageResponse
 
 # Change variable name and API name and prefix
 player_api = Blueprint('player_api', __name__,
@@ -32,12 +37,8 @@ class PlayerAPI:
             ''' #1: Key code block, setup PLAYER OBJECT '''
             po = Player(name=name, 
                         uid=uid,
-                        tokens=tokens)
-            
-            ''' Additional garbage error checking '''
-            # set password if provided
-            if password is not None:
-                po.set_password(password)            
+                        tokens=tokens,
+                        **({} if password is None else {'password': password}))  # hashed once, default when missing
             
             ''' #2: Key Code block to add user to database '''
             # create player in database
@@ -48,10 +49,12 @@ class PlayerAPI:
             # failure returns error
             return {'message': f'Processed {name}, either a format error or User ID {uid} is duplicate'}, 210
 
+        @versioned('players')  # 304 or cached bytes when unchanged, see api/conditional.py
         def get(self):
-            players = Player.query.all()    # read/extract all players from database
-            json_ready = [player.read() for player in players]  # prepare output in json
-            return jsonify(json_ready)  # jsonify creates Flask response object, more specific to APIs than json.dumps
+            fields, limit, after = pageArgs(Player)  # ?limit=&after=&fields= narrow the page
+            players = pageQuery(Player, fields, limit, after)    # read/extract players from database
+            read = lambda player: player.read(fields)  # prepare output in json
+            return pageResponse(players, read, nextCursor(Player, limit, after))  # jsonify or stream with next page cursor
 
         def put(self):
             body = request.get_json() # get the body of the request
@@ -69,5 +72,99 @@ class PlayerAPI:
             return f"{player.read()} Has been deleted"
 
 
+    # many players in one request, a JSON array or NDJSON, see api/bulk.py
+    class _Bulk(Resource):
+        def post(self):
+            def validate(row):
+                tokens = row.get('tokens', 0)
+                if not isinstance(tokens, int) or isinstance(tokens, bool):
+                    raise RowError('Tokens must be an integer')
+                return {"_name": textField(row, 'name', 'Name'),
+                        "_uid": textField(row, 'uid', 'User ID'),
+                        "_password": textField(row, 'password', 'Password', minimum=1, default='123qwerty'),
+                        "_tokens": tokens}
+
+            def hashPasswords(batch):  # one pool call per batch
+                for values, pwhash in zip(batch, password_pool.hashMany(values["_password"] for values in batch)):
+                    values["_password"] = pwhash
+
+            return bulkCreate(Player, validate, prepare=hashPasswords, unique='_uid')
+
+    # integer of body[key], None when missing or not an integer
+    def intField(body, key):
+        value = body.get(key)
+        return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+    # response of a failed token operation, 404 for unknown players, otherwise 409
+    def tokenError(error):
+        return {'message': str(error), 'uids': error.uids}, 404 if isinstance(error, UnknownPlayer) else 409
+
+    # add or take tokens of one player, e.g. PUT /azeemK/tokens {"delta": -5}, never below 0
+    class _Tokens(Resource):
+        def put(self, uid):
+            delta = PlayerAPI.intField(request.get_json(silent=True) or {}, 'delta')
+            if delta is None:
+                return {'message': 'delta must be an integer'}, 400
+            try:
+                tokens = addTokens(uid, delta)
+            except TokenError as error:
+                return PlayerAPI.tokenError(error)
+            return jsonify({"uid": uid, "tokens": tokens})
+
+    # move tokens between players in one transaction, {"from": "azeemK", "to": "joshW", "amount": 5}
+    class _Transfer(Resource):
+        def post(self):
+            body = request.get_json(silent=True) or {}
+            amount = PlayerAPI.intField(body, 'amount')
+            if amount is None or not isinstance(body.get('from'), str) or not isinstance(body.get('to'), str):
+                return {'message': 'Transfer needs from, to and an integer amount'}, 400
+            try:
+                balances = transferTokens(body['from'], body['to'], amount)
+            except TokenError as error:
+                return PlayerAPI.tokenError(error)
+            return jsonify(balances)
+
+    # many token changes in one commit, [{"uid": "azeemK", "delta": 3}, ...], all applied or none
+    class _TokensBatch(Resource):
+        def post(self):
+            rows = request.get_json(silent=True)
+            if not isinstance(rows, list):
+                return {'message': 'Body must be a JSON array of {"uid", "delta"} objects'}, 400
+            deltas = []
+            for number, row in enumerate(rows):
+                delta = PlayerAPI.intField(row, 'delta') if isinstance(row, dict) else None
+                if delta is None or not isinstance(row.get('uid'), str):
+                    return {'message': f'Row {number} needs a uid and an integer delta'}, 400
+                deltas.append((row['uid'], delta))
+            try:
+                changed = applyTokens(deltas)
+            except TokenError as error:
+                return PlayerAPI.tokenError(error)
+            return jsonify({"players": changed, "deltas": len(deltas)})
+
+    # players with the most tokens, e.g. /leaderboard?n=10, ties share a rank
+    class _Leaderboard(Resource):
+        @versioned('players')  # 304 or cached bytes when unchanged, see api/conditional.py
+        def get(self):
+            n = intArg('n', 1) or 10
+            if n > app.config['LEADERBOARD_SIZE']:
+                return {'message': f"n must be at most {app.config['LEADERBOARD_SIZE']}"}, 400
+            return jsonify(topPlayers(n))
+
+    # leaderboard rank of one player, e.g. /azeemK/rank
+    class _Rank(Resource):
+        @versioned('players')
+        def get(self, uid):
+            rank = rankPlayer(uid)
+            if rank is None:
+                return {'message': f'Player {uid} not found'}, 404
+            return jsonify(rank)
+
     # building RESTapi endpoint, method distinguishes action
     api.add_resource(Action, '/')
+    api.add_resource(_Bulk, '/bulk')
+    api.add_resource(_Transfer, '/transfer')
+    api.add_resource(_Leaderboard, '/leaderboard')
+    api.add_resource(_Rank, '/<string:uid>/rank')
+    api.add_resource(_TokensBatch, '/tokens/batch')
+    api.add_resource(_Tokens, '/<string:uid>/tokens')
@@ -1,8 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_restful import Api, Resource # used for REST API building
 from datetime import datetime
 
-from model.skintypes import SkinType
+from model.skintypes import SkinType, getRoutines, routine_cache
+from api.bulk import bulkCreate, textField
+from api.conditional import versioned
+from api.pagination import pageArgs, pageQuery, nextCursor, pageResponse
 
 skintype_api = Blueprint('skintype_api', __name__,
                    url_prefix='/api/skintype')
@@ -43,26 +46,52 @@ class SkinTypeAPI:
             skin_type_output = SkinType(skin_type=skin_type, 
                       moisturizer=moisturizer, face_cleanser=face_cleanser, serum=serum, sunscreen=sunscreen)
             
-            ''' Additional garbage error checking '''
-            # set skin_type if provided
-            if skin_type_output is not None:
-                skin_type_output.SkinType.setter(skin_type)
-            
             ''' #2: Key Code block to add SkinType to database '''
             # create SkinType in database
-            skin_type_output = SkinType.create()
+            skin_type_output = skin_type_output.create()
             # success returns json of SkinType
             if skin_type_output:
                 return jsonify(skin_type_output.read())
             # failure returns error
             return {'message': f'Processed {skin_type}, either a format error or User ID {moisturizer} is duplicate'}, 210
 
+    # many skin types in one request, a JSON array or NDJSON, see api/bulk.py
+    class _Bulk(Resource):
+        def post(self):
+            def validate(row):
+                return {"_skin_type": textField(row, 'skin_type', 'Skin type'),
+                        "_moisturizer": textField(row, 'moisturizer', 'Moisturizer'),
+                        "_face_cleanser": textField(row, 'face_cleanser', 'Face cleanser'),
+                        "_serum": textField(row, 'serum', 'Serum'),
+                        "_sunscreen": textField(row, 'sunscreen', 'Sunscreen')}
+            # rows bypass SkinType.create, cached routines are dropped
+            return bulkCreate(SkinType, validate, committed=routine_cache.clear)
+
     class _Read(Resource):
+        @versioned('skintypes')  # 304 or cached bytes when unchanged, see api/conditional.py
+        def get(self):
+            fields, limit, after = pageArgs(SkinType)  # ?limit=&after=&fields= narrow the page
+            skintypes = pageQuery(SkinType, fields, limit, after)    # read/extract skin types from database
+            read = lambda skintype: skintype.read(fields)  # prepare output in json
+            return pageResponse(skintypes, read, nextCursor(SkinType, limit, after))  # jsonify or stream with next page cursor
+
+    # routines of one skin type, e.g. /oily, served from the routine cache
+    class _ReadSkinType(Resource):
+        @versioned('skintypes')
+        def get(self, skin_type):
+            body = getRoutines(skin_type)
+            if body is None:
+                return {'message': f'Skin type {skin_type} not found'}, 404
+            return Response(body, mimetype='application/json')
+
+    # routine cache statistics, hits, misses and hit rate
+    class _CacheStats(Resource):
         def get(self):
-            skintypes = SkinType.query.all()    # read/extract all skin types from database
-            json_ready = [skintype.read() for skintype in skintypes]  # prepare output in json
-            return jsonify(json_ready)  # jsonify creates Flask response object, more specific to APIs than json.dumps
+            return routine_cache.stats()
 
     # building RESTapi endpoint
     api.add_resource(_Create, '/create')
-    api.add_resource(_Read, '/')
\ No newline at end of file
+    api.add_resource(_Bulk, '/bulk')
+    api.add_resource(_Read, '/')
+    api.add_resource(_CacheStats, '/cache/stats')
+    api.add_resource(_ReadSkinType, '/<string:skin_type>')
\ No newline at end of file
@@ -0,0 +1,31 @@
+from flask import Blueprint, abort, redirect, send_from_directory
+from werkzeug.security import safe_join
+
+from __init__ import app
+from model.images import imageDigest, imageURL
+
+# Serves uploaded content at the content addressed URLs returned by Post and Tost read()
+upload_api = Blueprint('upload_api', __name__,
+                   url_prefix=app.config['UPLOAD_URL'])
+
+# one year, the longest lifetime commonly honored by browsers and proxies
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+# GET an uploaded file by content digest and file name
+# -- send_from_directory streams with wsgi.file_wrapper (sendfile under gunicorn) and answers Range requests
+# -- a digest of older content redirects to the current URL of the file
+@upload_api.route('/<string:digest>/<path:filename>')
+def upload(digest, filename):
+    if safe_join(app.config['UPLOAD_FOLDER'], filename) is None:
+        abort(404)
+    try:
+        current = imageDigest(filename)
+    except (FileNotFoundError, IsADirectoryError):
+        abort(404)
+    if digest != current:
+        return redirect(imageURL(filename))
+    response = send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                                   conditional=True, etag=current, max_age=IMMUTABLE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
@@ -1,9 +1,16 @@
 import json
 from flask import Blueprint, request, jsonify
 from flask_restful import Api, Resource # used for REST API building
-from datetime import datetime
+from flask_login import current_user, login_required
+from datetime import date, datetime
 
+from __init__ import app
+from model.auth import issueToken, revokeToken, revokeUser
 from model.users import User
+from model.passwords import password_pool
+from api.bulk import RowError, bulkCreate, textField
+from api.conditional import versioned
+from api.pagination import pageArgs, pageQuery, nextCursor, pageResponse
 
 user_api = Blueprint('user_api', __name__,
                    url_prefix='/api/users')
@@ -32,12 +39,10 @@ class UserAPI:
 
             ''' #1: Key code block, setup USER OBJECT '''
             uo = User(name=name, 
-                      uid=uid)
+                      uid=uid,
+                      **({} if password is None else {'password': password}))  # hashed once, default when missing
             
             ''' Additional garbage error checking '''
-            # set password if provided
-            if password is not None:
-                uo.set_password(password)
             # convert to date type
             if dob is not None:
                 try:
@@ -54,11 +59,37 @@ class UserAPI:
             # failure returns error
             return {'message': f'Processed {name}, either a format error or User ID {uid} is duplicate'}, 400
 
+    # many users in one request, a JSON array or NDJSON, see api/bulk.py
+    class _Bulk(Resource):
+        def post(self):
+            def validate(row):
+                values = {"_name": textField(row, 'name', 'Name'),
+                          "_uid": textField(row, 'uid', 'User ID'),
+                          "_password": textField(row, 'password', 'Password', minimum=1, default='123qwerty'),
+                          "_dob": date.today()}
+                dob = row.get('dob')
+                if dob is not None:
+                    try:
+                        values["_dob"] = datetime.strptime(dob, '%Y-%m-%d').date()
+                    except (TypeError, ValueError):
+                        raise RowError(f'Date of birth format error {dob}, must be yyyy-mm-dd')
+                return values
+
+            def hashPasswords(batch):  # one pool call per batch
+                for values, pwhash in zip(batch, password_pool.hashMany(values["_password"] for values in batch)):
+                    values["_password"] = pwhash
+
+            return bulkCreate(User, validate, prepare=hashPasswords, unique='_uid')
+
     class _Read(Resource):
+        @versioned('users', 'posts')  # 304 or cached bytes when unchanged, see api/conditional.py
         def get(self):
-            users = User.query.all()    # read/extract all users from database
-            json_ready = [user.read() for user in users]  # prepare output in json
-            return jsonify(json_ready)  # jsonify creates Flask response object, more specific to APIs than json.dumps
+            fields, limit, after = pageArgs(User)  # ?limit=&after=&fields= narrow the page
+            # read/extract users from database, only requested columns, posts in one extra SELECT
+            users = pageQuery(User, fields, limit, after)
+            inline = request.args.get('inline', '').lower() in ('1', 'true')  # opt-in base64 images
+            read = lambda user: user.read(inline or None, fields)  # prepare output in json
+            return pageResponse(users, read, nextCursor(User, limit, after))  # jsonify or stream with next page cursor
     
     class _Security(Resource):
 
@@ -77,13 +108,40 @@ class UserAPI:
             if user is None or not user.is_password(password):
                 return {'message': f"Invalid user id or password"}, 400
             
-            ''' authenticated user '''
-            return jsonify(user.read())
+            ''' authenticated user, with a signed token for later requests '''
+            token, session = issueToken(user.uid)
+            response = jsonify({**user.read(), "token": token, "expires": session.expires})
+            response.set_cookie(app.config['AUTH_COOKIE'], token, max_age=app.config['AUTH_TOKEN_TTL'],
+                                httponly=True, samesite='Lax')
+            return response
+
+    # the authenticated user of a token, checked without a database query, e.g. Authorization: Bearer <token>
+    class _Me(Resource):
+        method_decorators = [login_required]
+
+        def get(self):
+            return jsonify({"uid": current_user.id, "issued": current_user.issued, "expires": current_user.expires})
+
+    # revoke the token of this request, ?all=1 revokes every token of the user
+    class _Logout(Resource):
+        method_decorators = [login_required]
+
+        def post(self):
+            if request.args.get('all', '').lower() in ('1', 'true'):
+                revokeUser(current_user.id)
+            else:
+                revokeToken(current_user)
+            response = jsonify({"message": f"{current_user.id} logged out"})
+            response.delete_cookie(app.config['AUTH_COOKIE'])
+            return response
 
             
 
     # building RESTapi endpoint
     api.add_resource(_Create, '/create')
+    api.add_resource(_Bulk, '/bulk')
     api.add_resource(_Read, '/')
     api.add_resource(_Security, '/authenticate')
+    api.add_resource(_Me, '/me')
+    api.add_resource(_Logout, '/logout')
     
\ No newline at end of file
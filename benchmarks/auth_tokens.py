@@ -0,0 +1,59 @@
+""" authenticated request throughput, a password check per request versus a signed token
+
+    python -m benchmarks.auth_tokens [threads] [requests per thread]
+"""
+import sys
+import threading
+import time
+
+from benchmarks.common import createApp, seedUsers, timed
+
+
+# requests from threads, send(test client, i) makes one, returns (requests per second, status counts)
+def load(app, threads, requests, send):
+    statuses = {}
+    lock = threading.Lock()
+
+    def client():
+        test_client = app.test_client(use_cookies=False)
+        for i in range(requests):
+            status = send(test_client, i).status_code
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * requests / (time.perf_counter() - start), statuses
+
+
+def main(threads=8, requests=25):
+    app = createApp('auth_tokens')
+    from __init__ import db
+    from model.auth import verifyToken
+    from model.users import User
+
+    with app.app_context():
+        seedUsers(1, posts=0)
+        uid = db.session.query(User._uid).filter(User._uid.like('bench%')).scalar()
+    login = {"uid": uid, "password": "123qwerty"}
+    token = app.test_client().post('/api/users/authenticate', json=login).json['token']
+    headers = {'Authorization': 'Bearer ' + token}
+
+    print(f"{threads} threads x {requests} requests, {app.config['PASSWORD_HASH_METHOD']}")
+    for name, send, count in [
+            ("authenticate each (before)", lambda client, i: client.post('/api/users/authenticate', json=login), requests // 5 or 1),
+            ("bearer token /me (after)", lambda client, i: client.get('/api/users/me', headers=headers), requests * 20)]:
+        rate, statuses = load(app, threads, count, send)
+        print(f"{name:27} {rate:9.1f} requests/s  statuses={statuses}")
+
+    with app.app_context():
+        median, best = timed(lambda: [verifyToken(token) for _ in range(1000)], repeat=5)
+    print(f"{'verifyToken':27} {median * 1000:9.1f}us per token (median of 1000)")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
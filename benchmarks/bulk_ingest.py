@@ -0,0 +1,54 @@
+""" rows per second of /api/clients/bulk, JSON array and NDJSON, versus one /api/clients/create per row
+
+    python -m benchmarks.bulk_ingest [rows] [batch sizes, e.g. 1,100,500,2000]
+"""
+import json
+import sys
+import time
+
+from benchmarks.common import createApp
+
+
+def products(count, start):
+    return [{"product": f"Bulk Product {start + n}", "ingredients": "Water, Glycerin, Niacinamide, Extract " + str(n % 97),
+             "skinType": "oily", "date": "2023"} for n in range(count)]
+
+
+def main(count=2000, batches=(1, 100, 500, 2000)):
+    app = createApp('bulk_ingest')
+    client = app.test_client()
+    offset = 0
+
+    def rate(post, rows):
+        start = time.perf_counter()
+        post(rows)
+        return len(rows) / (time.perf_counter() - start)
+
+    def perRow(rows):
+        for row in rows:
+            assert client.post('/api/clients/create', json=row).status_code == 200
+
+    def bulk(batch, ndjson):
+        def post(rows):
+            if ndjson:
+                body = ''.join(json.dumps(row) + '\n' for row in rows)
+                response = client.post(f'/api/clients/bulk?batch={batch}', data=body, content_type='application/x-ndjson')
+            else:
+                response = client.post(f'/api/clients/bulk?batch={batch}', json=rows)
+            assert response.get_json()['created'] == len(rows)
+        return post
+
+    print(f"{count} clients per run")
+    runs = [("per row /create", perRow)]
+    runs += [(f"bulk JSON batch={batch}", bulk(batch, False)) for batch in batches]
+    runs += [(f"bulk NDJSON batch={batch}", bulk(batch, True)) for batch in batches[-1:]]
+    for name, post in runs:
+        rows = products(count, offset)
+        offset += count
+        print(f"{name:24} {rate(post, rows):10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    batches = tuple(int(batch) for batch in args[1].split(',')) if len(args) > 1 else (1, 100, 500, 2000)
+    main(*[int(arg) for arg in args[:1]], batches=batches)
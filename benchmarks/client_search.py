@@ -0,0 +1,41 @@
+""" /api/clients/search latency as the catalog grows, versus a LIKE scan of the clients table
+
+    python -m benchmarks.client_search [largest catalog]
+"""
+import random
+import sys
+
+from benchmarks.common import createApp, seedClients, timed
+
+
+def main(largest=100000):
+    app = createApp('client_search')
+    from __init__ import db
+    from model.clients import Client, getIngredientIndex, ingredient_index
+
+    random.seed(1)
+    queries = ['all=niacinamide,glycerin&not=fragrance&skinType=oily&limit=50',
+               'any=extract 7,extract 42&limit=50',
+               'all=extract 7&limit=50',
+               'all=extract 1998,extract 1999&limit=50']  # rare, a scan reads the whole table to find them
+    client = app.test_client()
+    size = 0
+    target = 1000
+    print(f"{'clients':>8} {'rebuild':>10} " + ' '.join(f"{'query ' + str(n):>12}" for n in range(len(queries))) + f" {'LIKE query 3':>12}")
+    while target <= largest:
+        with app.app_context():
+            seedClients(target - size)
+            size = target
+            ingredient_index.invalidate()  # bulk inserts bypass Client.create
+            rebuild, _ = timed(getIngredientIndex, repeat=1)
+            like = lambda: Client.query.filter(Client._ingredients.like('%Extract 1998%'),
+                                               Client._ingredients.like('%Extract 1999%')).limit(50).all()
+            scan, _ = timed(like)
+        latencies = [timed(lambda: client.get('/api/clients/search?fields=id,product&' + query))[0] for query in queries]
+        print(f"{size:8} {rebuild * 1000:8.1f}ms " + ' '.join(f"{latency * 1000:10.2f}ms" for latency in latencies)
+              + f" {scan * 1000:10.2f}ms")
+        target *= 10
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
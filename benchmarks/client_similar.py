@@ -0,0 +1,66 @@
+""" /api/clients/<id>/similar, the vectorized similarity index versus a naive pairwise loop
+
+    python -m benchmarks.client_similar [largest catalog]
+"""
+import random
+import sys
+
+from benchmarks.common import createApp, seedClients, timed
+
+
+# top k (id, cosine) of one client by comparing its ingredient set with every other client in Python
+def naiveSimilar(tokens, id, k):
+    own = tokens[id]
+    scores = []
+    for other, other_tokens in tokens.items():
+        overlap = len(own & other_tokens)
+        if other != id and overlap:
+            scores.append((-overlap / (len(own) * len(other_tokens)) ** 0.5, other))
+    scores.sort()
+    return [(other, -score) for score, other in scores[:k]]
+
+
+def main(largest=20000):
+    app = createApp('client_similar')
+    from __init__ import db
+    from model.clients import Client, similarity_indexes
+    from model.ingredients import ingredientTokens
+    from model.similarity import SimilarityIndex
+
+    random.seed(1)
+    client = app.test_client()
+    app.config['SIMILAR_PRECOMPUTE'] = False  # timed here instead of in the background
+    size = 0
+    print(f"{'clients':>8} {'naive one':>10} {'naive all':>10} {'build':>10} {'index all':>10} "
+          f"{'one row':>10} {'add':>10} {'endpoint':>10}")
+    for target in (1000, 5000, largest):
+        with app.app_context():
+            seedClients(target - size)
+            size = target
+            rows = db.session.query(Client.id, Client._ingredients).all()
+        tokens = {id: ingredientTokens(ingredients) for id, ingredients in rows}
+        ids = random.sample(list(tokens), 20)
+        naive_one, _ = timed(lambda: [naiveSimilar(tokens, id, 10) for id in ids], repeat=1)
+        naive_one /= len(ids)
+        naive_all = naive_one * size  # every client, extrapolated
+
+        index = SimilarityIndex('cosine', 50)
+        build, _ = timed(lambda: index.rebuild(rows), repeat=1)
+        index_all, _ = timed(index.precompute, repeat=1)
+        drift = max(abs(a - b) for (_, a), (_, b) in zip(index.similar(ids[0], 10), naiveSimilar(tokens, ids[0], 10)))
+        assert drift < 1e-5, drift  # same scores, float32 rounding only
+        fresh = SimilarityIndex('cosine', 50)
+        fresh.rebuild(rows)
+        one_row, _ = timed(lambda: [fresh.similar(id, 10) for id in ids], repeat=1)
+        one_row /= len(ids)
+        add, _ = timed(lambda: index.add(10 ** 9, rows[0][1]), repeat=1)
+
+        similarity_indexes['cosine'].invalidate()  # bulk inserts bypass Client.create
+        client.get(f'/api/clients/{ids[0]}/similar')  # builds the index
+        endpoint, _ = timed(lambda: client.get(f'/api/clients/{random.choice(ids)}/similar?k=10&fields=id,product'))
+        print(f"{size:8} {naive_one * 1000:8.2f}ms {naive_all:9.1f}s {build * 1000:8.1f}ms {index_all:9.2f}s "
+              f"{one_row * 1000:8.2f}ms {add * 1000:8.2f}ms {endpoint * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
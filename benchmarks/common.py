@@ -0,0 +1,66 @@
+""" shared setup for benchmarks, run from the project root: python -m benchmarks.<name> """
+from datetime import date
+import os
+import random
+import secrets
+import statistics
+import tempfile
+import time
+
+
+# Starts the app against a new temporary SQLite database
+# -- DATABASE_URI and SECRET_KEY must be set before the app is imported, so import main here
+def createApp(name='bench'):
+    path = os.path.join(tempfile.mkdtemp(prefix='cskin-bench-'), name + '.db')
+    os.environ['DATABASE_URI'] = 'sqlite:///' + path
+    os.environ.setdefault('SECRET_KEY', secrets.token_hex(32))
+    from main import app
+    from model.boot import warmBoot
+    warmBoot()  # creates and seeds the database
+    return app
+
+
+# Bulk insert users, each with posts, hashing one password for all rows
+def seedUsers(count, posts=3):
+    from werkzeug.security import generate_password_hash
+    from __init__ import app, db
+    from model.users import User, Post
+
+    password = generate_password_hash('123qwerty', method=app.config['PASSWORD_HASH_METHOD'])
+    start = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    users = [{"id": start + i, "_name": f"Bench User {start + i}", "_uid": f"bench{start + i}",
+              "_password": password, "_dob": date(2000, 1, 1)} for i in range(count)]
+    notes = [{"userID": user["id"], "note": f"#### {user['_name']} note {num}", "image": 'ncs_logo.png'}
+             for user in users for num in range(posts)]
+    db.session.execute(User.__table__.insert(), users)
+    if notes:
+        db.session.execute(Post.__table__.insert(), notes)
+    db.session.commit()
+
+
+# Bulk insert clients with random ingredient lists drawn from a vocabulary with a few common ingredients
+def seedClients(count, vocabulary=2000):
+    from __init__ import db
+    from model.clients import Client
+
+    common = ['Water', 'Glycerin', 'Niacinamide', 'Phenoxyethanol', 'Fragrance']
+    rare = [f'Extract {n}' for n in range(vocabulary)]
+    skin_types = ['oily', 'dry', 'combination', 'sensitive', 'normal']
+    start = (db.session.query(db.func.max(Client.id)).scalar() or 0) + 1
+    rows = []
+    for id in range(start, start + count):
+        ingredients = [name for name in common if random.random() < 0.4] + random.sample(rare, 12)
+        rows.append({"id": id, "_product": f"Bench Product {id}", "_ingredients": ', '.join(ingredients),
+                     "_skinType": random.choice(skin_types), "_date": '2023'})
+    db.session.execute(Client.__table__.insert(), rows)
+    db.session.commit()
+
+
+# Run fn repeat times, returns (median, best) seconds
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), min(samples)
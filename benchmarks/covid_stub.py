@@ -0,0 +1,73 @@
+""" local stand-in for the RapidAPI COVID upstream, used by benchmarks and api/covid.py tests """
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+
+
+# payload shaped like the RapidAPI response, numbers are formatted strings as upstream sends them
+def samplePayload(countries=220, seed=1):
+    rng = random.Random(seed)
+    names = ["USA", "India", "Brazil", "France", "Germany", "UK", "Italy", "Spain", "Mexico", "Japan"]
+    names += [f"Country {i}" for i in range(countries - len(names))]
+    stats = []
+    for name in names[:countries]:
+        cases = rng.randint(1000, 100000000)
+        deaths = cases // rng.randint(50, 200)
+        stats.append({
+            "country_name": name,
+            "cases": f"{cases:,}",
+            "deaths": f"{deaths:,}",
+            "region": "",
+            "total_recovered": f"{cases - deaths:,}",
+            "new_deaths": f"{rng.randint(0, 100):,}",
+            "new_cases": f"{rng.randint(0, 10000):,}",
+            "serious_critical": f"{rng.randint(0, 5000):,}",
+            "active_cases": f"{rng.randint(0, 100000):,}",
+            "total_cases_per_1m_population": f"{rng.randint(0, 700000):,}",
+            "deaths_per_1m_population": f"{rng.randint(0, 6000):,}",
+            "total_tests": f"{rng.randint(0, 1000000000):,}",
+            "tests_per_1m_population": f"{rng.randint(0, 20000000):,}"
+        })
+    world = {"total_cases": "N/A", "total_deaths": "N/A", "statistic_taken_at": "2023-01-01 00:00:00"}
+    return {"countries_stat": stats, "statistic_taken_at": "2023-01-01 00:00:00", "world_total": world}
+
+
+# HTTP server in a daemon thread answering every GET with payload
+# -- set status to make it fail and delay to slow it down, requests counts the calls received
+class CovidStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload).encode()
+        self.status = 200
+        self.delay = 0.0
+        self.requests = 0
+        super().__init__(('127.0.0.1', 0), _Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        body = self.server.body if self.server.status == 200 else b'{"message": "unavailable"}'
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# start a stub serving payload (samplePayload() by default), returns the running CovidStub
+def startStub(payload=None):
+    stub = CovidStub(samplePayload() if payload is None else payload)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    return stub
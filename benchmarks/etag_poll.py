@@ -0,0 +1,35 @@
+""" latency and queries of polling /api/users/, uncached, from the response cache, and with If-None-Match
+
+    python -m benchmarks.etag_poll [users] [posts per user]
+"""
+import sys
+
+from benchmarks.common import createApp, seedUsers, timed
+
+
+def main(count=10000, posts=3):
+    app = createApp('etag_poll')
+    with app.app_context():
+        seedUsers(count, posts)
+    app.config['QUERY_DEBUG_HEADERS'] = True
+    from api.conditional import response_cache
+    client = app.test_client()
+    etag = client.get('/api/users/').headers['ETag']
+
+    def get(headers, cached=True):
+        if not cached:
+            response_cache.clear()
+        return client.get('/api/users/', headers=headers)
+
+    print(f"{count} users, {posts} posts each")
+    for name, cached, headers in [("full GET (before)", False, {}),
+                                  ("response cache", True, {}),
+                                  ("If-None-Match", True, {'If-None-Match': etag})]:
+        response = get(headers, cached)
+        median, best = timed(lambda: get(headers, cached), repeat=5)
+        print(f"{name:22} status={response.status_code}  bytes={len(response.data):9}  "
+              f"queries={response.headers['X-Query-Count']:>3}  median={median * 1000:8.2f}ms  best={best * 1000:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,268 @@
+""" offline benchmark of every API endpoint, throughput and latency percentiles compared with a saved baseline
+
+    python -m benchmarks.harness [--scale 1000] [--requests 200] [--threads 4] [--seed 1] [--only users,covid]
+                                 [--output benchmarks/results/latest.json] [--baseline benchmarks/results/baseline.json]
+                                 [--threshold 0.25] [--save-baseline]
+The app runs in this process against a temporary SQLite database seeded with scale users, clients and players,
+COVID data comes from a local stub upstream (benchmarks/covid_stub.py), nothing leaves the machine.
+Each scenario sends its requests from threads through the Flask test client after a short warm up. Seeded rows
+and the ids requests pick come from random seeded with --seed, the same seed gives the same data and requests.
+Results are written as JSON. With a baseline, a scenario regresses when its p95 latency grows or its throughput
+drops by more than threshold, or when a larger share of its requests fails, regressions are listed and the exit
+status is 1. A baseline recorded with other --scale, --requests, --threads, --seed or hash method is not compared,
+the exit status is 2.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import createApp, seedClients, seedUsers
+
+RESULTS = os.path.join(os.path.dirname(__file__), 'results')
+COMPARABLE = ('scale', 'requests', 'threads', 'seed', 'hash_method')  # meta a baseline must share to be compared
+PASSWORD = '123qwerty'  # password of seeded users
+
+unique = itertools.count()  # suffix of created rows, unique across threads
+
+
+# Scenarios as (name, share of --requests, send(client, state) returning a response), every endpoint of api/
+# -- state holds ids and an admin login token found after seeding, shares keep password hashing, bulk and
+#    whole table ?stream=1 scenarios short
+def scenarios():
+    return [
+        ("users.list", 1, lambda client, state: client.get('/api/users/?limit=100')),
+        ("users.stream", 0.1, lambda client, state: client.get('/api/users/?stream=1')),
+        ("users.create", 0.05, lambda client, state: client.post('/api/users/create', json={
+            "name": "Harness User", "uid": f"harness{next(unique)}", "password": PASSWORD, "dob": "2000-01-01"})),
+        ("users.bulk", 0.02, lambda client, state: client.post('/api/users/bulk', json=[
+            {"name": "Harness Bulk", "uid": f"harnessbulk{next(unique)}", "password": PASSWORD} for _ in range(10)])),
+        ("users.authenticate", 0.05, lambda client, state: client.post('/api/users/authenticate', json={
+            "uid": random.choice(state["uids"]), "password": PASSWORD})),
+        ("users.me", 1, lambda client, state: client.get('/api/users/me', headers=state["auth"])),
+        ("users.logout", 0.5, lambda client, state: client.post('/api/users/logout', headers=bearer(state["uids"][1]))),
+        ("clients.list", 1, lambda client, state: client.get('/api/clients/?limit=100')),
+        ("clients.stream", 0.1, lambda client, state: client.get('/api/clients/?stream=1')),
+        ("clients.create", 0.5, lambda client, state: client.post('/api/clients/create', json={
+            "product": f"Harness Product {next(unique)}", "ingredients": "Water, Glycerin, Niacinamide",
+            "skinType": "oily", "date": "2023"})),
+        ("clients.bulk", 0.1, lambda client, state: client.post('/api/clients/bulk', json=[
+            {"product": f"Harness Bulk {next(unique)}", "ingredients": "Water, Glycerin", "skinType": "dry",
+             "date": "2023"} for _ in range(100)])),
+        ("clients.search", 1, lambda client, state: client.get('/api/clients/search?any=Niacinamide&not=Fragrance&limit=50')),
+        ("clients.similar", 1, lambda client, state: client.get(f'/api/clients/{random.choice(state["client_ids"])}/similar?k=10')),
+        ("skintype.list", 1, lambda client, state: client.get('/api/skintype/')),
+        ("skintype.read", 1, lambda client, state: client.get('/api/skintype/oily')),
+        ("skintype.stats", 1, lambda client, state: client.get('/api/skintype/cache/stats')),
+        ("skintype.create", 0.5, lambda client, state: client.post('/api/skintype/create', json={
+            "skin_type": f"harness{next(unique) % 20}", "moisturizer": "Harness Moisturizer",
+            "face_cleanser": "Harness Cleanser", "serum": "Harness Serum", "sunscreen": "Harness Sunscreen"})),
+        ("skintype.bulk", 0.1, lambda client, state: client.post('/api/skintype/bulk', json=[
+            {"skin_type": f"harnessbulk{next(unique)}", "moisturizer": "Harness Moisturizer",
+             "face_cleanser": "Harness Cleanser", "serum": "Harness Serum", "sunscreen": "Harness Sunscreen"}
+            for _ in range(100)])),
+        ("players.list", 1, lambda client, state: client.get('/api/players/?limit=100')),
+        ("players.stream", 0.1, lambda client, state: client.get('/api/players/?stream=1')),
+        ("players.tokens", 1, lambda client, state: client.put(f'/api/players/{random.choice(state["players"])}/tokens',
+                                                               json={"delta": 1})),
+        ("players.transfer", 1, lambda client, state: client.post('/api/players/transfer', json=dict(
+            zip(("from", "to"), random.sample(state["players"], 2)), amount=1))),
+        ("players.batch", 1, lambda client, state: client.post('/api/players/tokens/batch', json=[
+            {"uid": uid, "delta": 1} for uid in random.sample(state["players"], 10)])),
+        ("players.leaderboard", 1, lambda client, state: client.get('/api/players/leaderboard?n=10')),
+        ("players.rank", 1, lambda client, state: client.get(f'/api/players/{random.choice(state["players"])}/rank')),
+        ("jokes.list", 1, lambda client, state: client.get('/api/jokes/')),
+        ("jokes.read", 1, lambda client, state: client.get(f'/api/jokes/{random.randrange(state["jokes"])}')),
+        ("jokes.random", 1, lambda client, state: client.get('/api/jokes/random')),
+        ("jokes.count", 1, lambda client, state: client.get('/api/jokes/count')),
+        ("jokes.like", 1, lambda client, state: client.put(f'/api/jokes/like/{random.randrange(state["jokes"])}')),
+        ("jokes.jeer", 1, lambda client, state: client.put(f'/api/jokes/jeer/{random.randrange(state["jokes"])}')),
+        ("jokes.top", 1, lambda client, state: client.get('/api/jokes/top?by=haha&n=5')),
+        ("jokes.rank", 1, lambda client, state: client.get(f'/api/jokes/rank/{random.randrange(state["jokes"])}?by=haha')),
+        ("covid.read", 1, lambda client, state: client.get('/api/covid/')),
+        ("covid.country", 1, lambda client, state: client.get('/api/covid/USA')),
+        ("covid.top", 1, lambda client, state: client.get('/api/covid/top?metric=cases&n=10')),
+        ("covid.range", 1, lambda client, state: client.get('/api/covid/range?metric=deaths&min=1000&max=50000')),
+        ("covid.search", 1, lambda client, state: client.get('/api/covid/search?prefix=un&n=5')),
+        ("uploads.image", 1, lambda client, state: client.get(state["upload"])),
+        ("admin.caches", 1, lambda client, state: client.get('/api/admin/caches', headers=state["auth"])),
+    ]
+
+
+# Authorization header of a new login token of uid, issued without a password check
+def bearer(uid):
+    from model.auth import issueToken
+    return {'Authorization': 'Bearer ' + issueToken(uid)[0]}
+
+
+# seed scale rows per table and point the COVID cache at a local stub, returns the scenario state
+def prepare(app, scale):
+    from __init__ import db
+    from benchmarks.covid_stub import startStub
+    from api.covid import covid_cache
+    from model.images import imageURL
+    from model.jokes import countJokes
+    from model.players import Player
+    from model.users import User
+
+    with app.app_context():
+        seedUsers(scale, posts=2)
+        seedClients(scale)
+        db.session.execute(Player.__table__.insert(), [
+            {"_name": f"Harness Player {n}", "_uid": f"harnessplayer{n}", "_password": "x",
+             "_tokens": 1000 + random.randrange(1000)} for n in range(scale)])  # enough for every transfer
+        db.session.commit()
+        uids = [uid for (uid,) in db.session.query(User._uid).filter(User._uid.like('bench%')).limit(100)]
+        client_ids = [id for (id,) in db.session.execute(db.text("SELECT id FROM clients LIMIT 1000"))]
+
+    stub = startStub()
+    app.config['COVID_API_URL'] = stub.url
+    covid_cache.path = os.path.join(tempfile.mkdtemp(prefix='cskin-bench-'), 'covid.json.gz')
+    covid_cache.value = covid_cache.fetched = None  # the snapshot of volumes/ is not used
+
+    app.config['ADMIN_UIDS'] = {uids[0]}
+    token = app.test_client().post('/api/users/authenticate', json={"uid": uids[0], "password": PASSWORD}).json['token']
+    return {"uids": uids, "client_ids": client_ids, "players": [f"harnessplayer{n}" for n in range(scale)],
+            "jokes": countJokes(), "upload": imageURL('ncs_logo.png'), "auth": {'Authorization': 'Bearer ' + token},
+            "stub": stub}
+
+
+# latency percentile p (0-100) of sorted samples, nearest rank
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, max(0, round(p / 100 * len(samples)) - 1))]
+
+
+# send count requests from threads, returns the scenario result
+def run(app, send, state, count, threads, warmup=3):
+    client = app.test_client(use_cookies=False)
+    for _ in range(warmup):
+        send(client, state)
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(requests):
+        test_client = app.test_client(use_cookies=False)
+        local, failed = [], 0
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = send(test_client, state)
+            response.get_data()  # streamed bodies are read
+            local.append(time.perf_counter() - start)
+            failed += response.status_code >= 300
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    shares = [count // threads + (i < count % threads) for i in range(threads)]
+    workers = [threading.Thread(target=worker, args=(share,)) for share in shares if share]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {"requests": len(latencies), "errors": sum(errors), "throughput": len(latencies) / elapsed,
+            "mean_ms": statistics.fmean(latencies) * 1000, "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000, "p99_ms": percentile(latencies, 99) * 1000}
+
+
+# scenarios of results that regressed against baseline, as (name, reason)
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append((name, f"p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms"))
+        if result["throughput"] < before["throughput"] * (1 - threshold):
+            regressions.append((name, f"throughput {before['throughput']:.0f}/s -> {result['throughput']:.0f}/s"))
+        if result["errors"] / result["requests"] > before["errors"] / before["requests"]:  # failing fast is no gain
+            regressions.append((name, f"errors {before['errors']}/{before['requests']} -> "
+                                      f"{result['errors']}/{result['requests']}"))
+    return regressions
+
+
+# meta keys whose values differ between results and baseline, as (key, baseline value, value)
+def mismatches(results, baseline):
+    return [(key, baseline["meta"].get(key), results["meta"].get(key)) for key in COMPARABLE
+            if baseline["meta"].get(key) != results["meta"].get(key)]
+
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.harness', description=__doc__.split('\n')[0])
+    parser.add_argument('--scale', type=int, default=1000, help='seeded users, clients and players')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario, before its share')
+    parser.add_argument('--threads', type=int, default=4, help='concurrent clients per scenario')
+    parser.add_argument('--seed', type=int, default=1, help='random seed of seeded data and request ids')
+    parser.add_argument('--only', default='', help='comma separated scenario name prefixes, e.g. users,covid.top')
+    parser.add_argument('--output', default=os.path.join(RESULTS, 'latest.json'))
+    parser.add_argument('--baseline', default=os.path.join(RESULTS, 'baseline.json'))
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed p95 growth and throughput drop')
+    parser.add_argument('--save-baseline', action='store_true', help='also store the results as the baseline')
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)  # before the warm boot, which seeds jokes votes with random too
+    app = createApp('harness')
+    state = prepare(app, args.scale)
+    prefixes = [prefix for prefix in args.only.split(',') if prefix]
+    selected = [scenario for scenario in scenarios()
+                if not prefixes or any(scenario[0].startswith(prefix) for prefix in prefixes)]
+
+    results = {"meta": {"time": time.strftime('%Y-%m-%dT%H:%M:%S'), "commit": gitCommit(),
+                        "python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "scale": args.scale, "requests": args.requests,
+                        "threads": args.threads, "seed": args.seed, "hash_method": app.config['PASSWORD_HASH_METHOD']},
+               "scenarios": {}}
+    print(f"scale {args.scale}, {args.requests} requests, {args.threads} threads, seed {args.seed}")
+    print(f"{'scenario':20} {'requests':>8} {'errors':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, share, send in selected:
+        result = run(app, send, state, max(args.threads, int(args.requests * share)), args.threads)
+        results["scenarios"][name] = result
+        print(f"{name:20} {result['requests']:8} {result['errors']:6} {result['throughput']:9.1f} "
+              f"{result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {result['p99_ms']:8.2f}")
+
+    paths = [args.output] + ([args.baseline] if args.save_baseline else [])
+    for path in paths:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(results, file, indent=2)
+    print(f"results written to {', '.join(paths)}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    different = mismatches(results, baseline)
+    if different:
+        print(f"not compared with {args.baseline}, recorded with other settings:")
+        for key, before, now in different:
+            print(f"  {key}: {before} (baseline) != {now}")
+        return 2
+    regressions = compare(results, baseline, args.threshold)
+    print(f"compared with {args.baseline} ({baseline['meta'].get('commit')}), threshold {args.threshold:.0%}")
+    for name, reason in regressions:
+        print(f"REGRESSION {name:20} {reason}")
+    if not regressions:
+        print("no regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+""" top-k and rank of jokes with the incremental RankIndex versus a full scan
+
+    python -m benchmarks.joke_leaderboard [jokes] [votes]
+"""
+import heapq
+import random
+import sys
+import time
+
+from model.ranking import RankIndex
+
+
+# microseconds per call of fn over calls
+def perCall(fn, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main(jokes=1000000, votes=1000000):
+    rng = random.Random(1)
+    counts = {id: 0 for id in range(jokes)}
+
+    start = time.perf_counter()
+    ranking = RankIndex(counts)
+    print(f"{jokes:,} jokes, build {time.perf_counter() - start:.2f}s")
+
+    ids = [int(rng.paretovariate(1.2)) % jokes for _ in range(votes)]  # a few jokes get most votes
+
+    def vote(i):
+        id = ids[i]
+        counts[id] += 1
+        ranking.set(id, counts[id])
+
+    print(f"vote (index update)  {perCall(vote, votes):10.2f}us")
+    probes = [rng.randrange(jokes) for _ in range(1000)]
+    print(f"top 5   index        {perCall(lambda i: ranking.top(5), 1000):10.2f}us")
+    print(f"top 5   full scan    {perCall(lambda i: heapq.nlargest(5, counts.items(), key=lambda item: item[1]), 3):10.2f}us")
+    print(f"rank    index        {perCall(lambda i: ranking.rank(probes[i]), 1000):10.2f}us")
+    print(f"rank    full scan    {perCall(lambda i: 1 + sum(1 for count in counts.values() if count > counts[probes[i]]), 3):10.2f}us")
+
+    assert ranking.top(5) == heapq.nsmallest(5, ((id, count) for id, count in counts.items() if count),
+                                             key=lambda item: (-item[1], item[0]))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
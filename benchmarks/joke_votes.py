@@ -0,0 +1,72 @@
+""" vote throughput of the batched joke vote counter, and a check that no vote is lost
+
+    python -m benchmarks.joke_votes [threads] [votes per thread] [processes]
+"""
+import multiprocessing
+import sys
+import threading
+import time
+
+from benchmarks.common import createApp
+
+
+# cast votes from threads in this process, returns votes cast
+def castVotes(threads, votes):
+    from model.jokes import addJokeHaHa, addJokeBooHoo, countJokes, joke_votes
+
+    count = countJokes()
+
+    def voter(offset):
+        for i in range(votes):
+            id = (offset + i) % count
+            if i % 3:
+                addJokeHaHa(id)
+            else:
+                addJokeBooHoo(id)
+
+    workers = [threading.Thread(target=voter, args=(offset,)) for offset in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    joke_votes.flush()
+    return threads * votes
+
+
+# a forked worker process sharing the database file, like a gunicorn worker
+def workerProcess(threads, votes):
+    from __init__ import app, db
+    with app.app_context():
+        db.engine.dispose()  # connections are not shared with the parent
+    castVotes(threads, votes)
+
+
+def main(threads=8, votes=5000, processes=1):
+    app = createApp('joke_votes')
+    from __init__ import db
+    from model.jokes import getJokes, loadJokes
+
+    with app.app_context():
+        loadJokes()
+        before = sum(joke['haha'] + joke['boohoo'] for joke in getJokes())
+
+    start = time.perf_counter()
+    fork = multiprocessing.get_context('fork')
+    others = [fork.Process(target=workerProcess, args=(threads, votes)) for _ in range(processes - 1)]
+    for process in others:
+        process.start()
+    cast = castVotes(threads, votes)
+    for process in others:
+        process.join()
+    elapsed = time.perf_counter() - start
+    cast *= processes
+
+    with app.app_context():
+        loadJokes()
+        after = sum(joke['haha'] + joke['boohoo'] for joke in getJokes())
+    print(f"{processes} process(es) x {threads} threads x {votes} votes")
+    print(f"cast={cast} persisted={after - before} lost={cast - (after - before)}  {cast / elapsed:,.0f} votes/s")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:4]])
@@ -0,0 +1,65 @@
+""" /api/users/authenticate throughput versus password pool size, and 503 backpressure when the queue is full
+
+    python -m benchmarks.login_pool [threads] [logins per thread] [pool sizes, e.g. 0,1,2,4]
+"""
+import os
+import sys
+import threading
+import time
+
+from benchmarks.common import createApp, seedUsers
+
+
+# logins from threads against the app, returns (logins per second, status counts)
+def login(app, uids, threads, logins):
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(offset):
+        test_client = app.test_client()
+        for i in range(logins):
+            uid = uids[(offset * logins + i) % len(uids)]
+            response = test_client.post('/api/users/authenticate', json={"uid": uid, "password": "123qwerty"})
+            status = response.status_code
+            if status == 503:
+                status = f"503 Retry-After {response.headers.get('Retry-After')}"
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    workers = [threading.Thread(target=client, args=(offset,)) for offset in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * logins / (time.perf_counter() - start), statuses
+
+
+def main(threads=8, logins=10, sizes=(0, 1, 2, 4)):
+    app = createApp('login_pool')
+    from __init__ import db
+    import model.users
+    from model.passwords import PasswordPool
+
+    with app.app_context():
+        seedUsers(100, posts=0)
+        uids = [uid for (uid,) in db.session.query(model.users.User._uid).filter(model.users.User._uid.like('bench%'))]
+
+    print(f"{threads} threads x {logins} logins, {app.config['PASSWORD_HASH_METHOD']}, {os.cpu_count()} CPUs")
+    for size in sizes:
+        # queue deep enough that every thread waits instead of being turned away
+        model.users.password_pool = PasswordPool(size, threads, app.config['PASSWORD_HASH_METHOD'])
+        rate, statuses = login(app, uids, threads, logins)
+        label = "request thread" if size == 0 else f"pool of {size}"
+        print(f"{label:15} {rate:8.1f} logins/s  statuses={statuses}")
+
+    # no queue, logins beyond the pool workers are answered 503 with Retry-After
+    model.users.password_pool = PasswordPool(1, 0, app.config['PASSWORD_HASH_METHOD'])
+    rate, statuses = login(app, uids, threads, logins)
+    print(f"{'pool 1, no queue':15} {rate:8.1f} logins/s  statuses={statuses}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sizes = tuple(int(size) for size in args[2].split(',')) if len(args) > 2 else (0, 1, 2, 4)
+    main(*[int(arg) for arg in args[:2]], sizes=sizes)
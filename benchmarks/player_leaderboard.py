@@ -0,0 +1,43 @@
+""" leaderboard top-N and rank latency, sorting the full player dump versus the _tokens index and snapshot
+
+    python -m benchmarks.player_leaderboard [players] [n]
+"""
+import random
+import sys
+
+from benchmarks.common import createApp, timed
+
+
+def main(count=1000000, n=10):
+    app = createApp('player_leaderboard')
+    from __init__ import db
+    from model.players import Player, addTokens, getLeaderboard, rankPlayer, topPlayers
+
+    with app.app_context():
+        for start in range(0, count, 100000):
+            db.session.execute(Player.__table__.insert(), [
+                {"_name": f"Bench {id}", "_uid": f"bench{id}", "_password": "x", "_tokens": random.randrange(100000)}
+                for id in range(start, min(start + 100000, count))])
+        db.session.commit()
+        plan = db.session.execute(db.text("EXPLAIN QUERY PLAN SELECT count(*) FROM players WHERE _tokens > 5")).all()
+        print(f"{count} players, top {n}, rank plan: {plan[-1][-1]}")
+
+        def dump():  # before: every player read and sorted by the client
+            db.session.remove()
+            players = [player.read() for player in Player.query.all()]
+            return sorted(players, key=lambda player: -(player['tokens'] or 0))[:n]
+
+        uids = {name: db.session.query(Player._uid).order_by(Player._tokens.desc()).offset(offset).limit(1).scalar()
+                for name, offset in [("top", 0), ("middle", count // 2), ("bottom", count - 1)]}
+        rows = [("full dump sort (before)", lambda: dump(), 1),
+                ("snapshot rebuild", lambda: (setattr(sys.modules['model.players'], 'leaderboard', None), getLeaderboard()), 3),
+                ("top-N from snapshot", lambda: topPlayers(n), 20)]
+        rows += [(f"rank of {name} player", lambda uid=uid: rankPlayer(uid), 20) for name, uid in uids.items()]
+        rows.append(("token change + rank", lambda: (addTokens(uids["top"], 1), rankPlayer(uids["top"])), 3))
+        for name, fn, repeat in rows:
+            median, best = timed(fn, repeat)
+            print(f"{name:24} median={median * 1000:9.2f}ms  best={best * 1000:9.2f}ms")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,85 @@
+""" mixed reads and writes from N worker processes, per storage profile
+
+    python -m benchmarks.storage_concurrency [processes] [seconds] [write percent]
+Each profile runs in its own interpreter, as the profile is applied when the app is imported.
+"""
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.common import createApp
+
+PROFILES = ('compat', 'concurrent')
+
+
+# one worker process: random player reads and token increments until deadline, returns (reads, writes, errors)
+def worker(deadline, write_percent, results):
+    from sqlalchemy.exc import OperationalError
+    from __init__ import app, db
+    from model.players import Player
+
+    reads = writes = errors = 0
+    with app.app_context():
+        db.engine.dispose()  # connections are not shared with the parent
+        count = db.session.query(db.func.count(Player.id)).scalar()
+        while time.time() < deadline:
+            try:
+                if random.randrange(100) < write_percent:
+                    db.session.execute(db.text("UPDATE players SET _tokens = _tokens + 1 WHERE id = :id"),
+                                       {"id": random.randint(1, count)})
+                    db.session.commit()
+                    writes += 1
+                else:
+                    Player.query.filter(Player.id > random.randint(0, count)).order_by(Player.id).limit(20).all()
+                    db.session.commit()  # ends the read transaction, like the end of a request
+                    reads += 1
+            except OperationalError:  # database is locked
+                db.session.rollback()
+                errors += 1
+    results.put((reads, writes, errors))
+
+
+# run one profile in this interpreter
+def runProfile(profile, processes, seconds, write_percent):
+    os.environ['STORAGE_PROFILE'] = profile
+    app = createApp('storage_' + profile)
+    from __init__ import db
+    from model.players import Player
+
+    with app.app_context():
+        db.session.execute(Player.__table__.insert(), [{"_name": f"Bench {n}", "_uid": f"bench{n}", "_password": "x",
+                                                        "_tokens": 0} for n in range(10000)])
+        db.session.commit()
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    deadline = time.time() + seconds
+    workers = [context.Process(target=worker, args=(deadline, write_percent, results)) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    totals = [sum(values) for values in zip(*[results.get() for _ in workers])]
+    for process in workers:
+        process.join()
+    reads, writes, errors = totals
+    print(f"{profile:11} {reads / seconds:10.0f} reads/s {writes / seconds:9.0f} writes/s {errors:7} locked errors")
+
+
+def main(processes=4, seconds=5, write_percent=20):
+    print(f"{processes} processes, {seconds}s, {write_percent}% writes")
+    for profile in PROFILES:
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.storage_concurrency', '--profile', profile,
+                                 str(processes), str(seconds), str(write_percent)], capture_output=True, text=True)
+        lines = [line for line in output.stdout.splitlines() if line.startswith(profile)]
+        print(lines[-1] if lines else output.stderr.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ['--profile']:
+        runProfile(args[1], *[int(arg) for arg in args[2:]])
+    else:
+        main(*[int(arg) for arg in args])
@@ -0,0 +1,49 @@
+""" peak memory of list endpoints built with jsonify versus ?stream=1
+
+    python -m benchmarks.stream_memory [rows]
+"""
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import createApp
+
+
+# Bulk insert skin type rows
+def seedSkinTypes(count):
+    from __init__ import db
+    from model.skintypes import SkinType
+
+    rows = [{"_skin_type": f"type{i % 50}", "_moisturizer": f"Moisturizer {i}", "_face_cleanser": f"Cleanser {i}",
+             "_serum": f"Serum {i}", "_sunscreen": f"Sunscreen {i}"} for i in range(count)]
+    db.session.execute(SkinType.__table__.insert(), rows)
+    db.session.commit()
+
+
+# peak traced bytes and seconds to consume the whole response of url
+def measure(client, url):
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed, size
+
+
+def main(count=100000):
+    app = createApp('stream_memory')
+    with app.app_context():
+        seedSkinTypes(count)
+    client = app.test_client()
+
+    print(f"{count} skintype rows")
+    for url in ['/api/skintype/', '/api/skintype/?stream=1']:
+        peak, elapsed, size = measure(client, url)
+        print(f"{url:26} peak={peak / 2**20:8.1f}MiB  time={elapsed * 1000:8.1f}ms  body={size / 2**20:6.1f}MiB")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
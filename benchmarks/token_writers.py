@@ -0,0 +1,100 @@
+""" lost updates and throughput of concurrent token awards, read-modify-write versus atomic UPDATE
+
+    python -m benchmarks.token_writers [writers] [awards per writer] [players]
+Writers are forked processes awarding 1 token to random players, then one batch of 10000 deltas is applied. The totals are checked against the number
+of awards, transfers between players must keep the total unchanged. The run fails when an update was lost.
+"""
+import multiprocessing
+import random
+import sys
+import time
+
+from benchmarks.common import createApp
+
+
+# one writer: awards with method, then transfers when asked, returns (awards made, errors)
+def writer(method, uids, awards, transfers, results):
+    from sqlalchemy.exc import OperationalError
+    from __init__ import app, db
+    from model.players import Player, TokenError, addTokens, transferTokens
+
+    made = errors = 0
+    with app.app_context():
+        db.engine.dispose(close=False)  # connections are not shared with the parent
+        for _ in range(awards):
+            uid = random.choice(uids)
+            try:
+                if method == 'read-modify-write':  # PlayerAPI.Action.put before
+                    player = Player.query.filter_by(_uid=uid).first()
+                    player.update({"tokens": player.tokens + 1})
+                else:
+                    addTokens(uid, 1)
+                made += 1
+            except OperationalError:  # database is locked
+                db.session.rollback()
+                errors += 1
+        for _ in range(transfers):
+            source, target = random.sample(uids, 2)
+            try:
+                transferTokens(source, target, 1)
+            except (TokenError, OperationalError):
+                db.session.rollback()
+    results.put((made, errors))
+
+
+# tokens of uids in the database
+def total(uids):
+    from __init__ import db
+    from model.players import Player
+    return db.session.query(db.func.sum(Player._tokens)).filter(Player._uid.in_(uids)).scalar()
+
+
+def main(writers=32, awards=200, players=10):
+    app = createApp('token_writers')
+    from __init__ import db
+    from model.players import Player
+
+    uids = [f'token{n}' for n in range(players)]
+    with app.app_context():
+        db.session.execute(Player.__table__.insert(), [{"_name": uid, "_uid": uid, "_password": "x", "_tokens": 0}
+                                                       for uid in uids])
+        db.session.commit()
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('fork')
+    print(f"{writers} writers, {awards} awards each, {players} players")
+    lost = 0
+    for method, transfers in [('read-modify-write', 0), ('atomic UPDATE', 20)]:
+        with app.app_context():
+            before = total(uids)
+            db.engine.dispose()
+        results = context.Queue()
+        start = time.perf_counter()
+        processes = [context.Process(target=writer, args=(method, uids, awards, transfers, results)) for _ in range(writers)]
+        for process in processes:
+            process.start()
+        made, errors = [sum(values) for values in zip(*[results.get() for _ in processes])]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+        with app.app_context():
+            missing = made - (total(uids) - before)
+            db.engine.dispose()
+        print(f"{method:18} {made / elapsed:8.0f} awards/s  {missing:6} lost updates  {errors:4} locked errors")
+        if method == 'atomic UPDATE':
+            lost = missing
+
+    # batch form, many deltas in one commit
+    from model.players import applyTokens
+    deltas = [(random.choice(uids), 1) for _ in range(10000)]
+    with app.app_context():
+        start = time.perf_counter()
+        applyTokens(deltas)
+        elapsed = time.perf_counter() - start
+    print(f"{'applyTokens batch':18} {len(deltas) / elapsed:8.0f} deltas/s  ({len(deltas)} deltas to {players} players in one commit)")
+    if lost:
+        sys.exit("atomic UPDATE lost updates")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:4]])
@@ -0,0 +1,45 @@
+""" query count and latency of /api/users/ with lazy versus select-in loaded posts
+
+    python -m benchmarks.users_nplus1 [users] [posts per user]
+"""
+import sys
+
+from benchmarks.common import createApp, seedUsers, timed
+
+
+def main(count=10000, posts=3):
+    app = createApp('users_nplus1')
+    from __init__ import db
+    from sqlalchemy.orm import selectinload
+    from model.users import User
+    from model.sqlstats import queryCount
+
+    with app.app_context():
+        seedUsers(count, posts)
+
+    # each variant starts from an empty session, otherwise posts would already be loaded
+    def lazy():
+        db.session.remove()
+        return [user.read() for user in User.query.all()]
+
+    def selectin():
+        db.session.remove()
+        return [user.read() for user in User.query.options(selectinload(User.posts)).all()]
+
+    print(f"{count} users, {posts} posts each")
+    for name, fn in [("lazy (before)", lazy), ("selectin (after)", selectin)]:
+        with app.test_request_context():
+            before = queryCount()
+            fn()
+            queries = queryCount() - before
+            median, best = timed(fn, repeat=3)
+        print(f"{name:18} queries={queries:6}  median={median * 1000:9.1f}ms  best={best * 1000:9.1f}ms")
+
+    # the endpoint itself, as clients see it
+    app.config['QUERY_DEBUG_HEADERS'] = True
+    response = app.test_client().get('/api/users/')
+    print(f"GET /api/users/    X-Query-Count={response.headers['X-Query-Count']}  X-Query-Time={response.headers['X-Query-Time']}")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
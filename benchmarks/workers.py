@@ -0,0 +1,108 @@
+""" requests/s of a preloaded gunicorn server by worker count
+
+    python -m benchmarks.workers [max workers] [seconds] [clients]
+Worker counts double from 1 up to max workers, the CPU count when missing. Each count starts gunicorn with
+gunicorn.conf.py against one temporary SQLite database, the app is preloaded and seeded once by the master.
+Client processes send keep-alive GETs to a mix of read endpoints and a few joke votes.
+"""
+import http.client
+import multiprocessing
+import os
+import random
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+PATHS = ['/api/jokes/', '/api/jokes/3', '/api/users/?limit=20', '/api/clients/?limit=20&fields=id,product',
+         '/api/skintype/oily', '/api/players/']
+VOTE_PERCENT = 5
+
+
+# free TCP port on localhost
+def freePort():
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        return listener.getsockname()[1]
+
+
+# wait until the server answers, False on timeout
+def waitReady(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/api/jokes/count')
+            if connection.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+# one client process: requests until deadline over one keep-alive connection, returns (ok, errors)
+def client(port, deadline, results):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    ok = errors = 0
+    while time.time() < deadline:
+        if random.randrange(100) < VOTE_PERCENT:
+            method, path = 'PUT', f'/api/jokes/like/{random.randrange(18)}'
+        else:
+            method, path = 'GET', random.choice(PATHS)
+        try:
+            connection.request(method, path)
+            response = connection.getresponse()
+            response.read()
+            if response.status == 200:
+                ok += 1
+            else:
+                errors += 1
+        except OSError:
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    results.put((ok, errors))
+
+
+# start gunicorn with workers and measure, returns (requests/s, errors)
+def run(workers, seconds, clients):
+    port = freePort()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_BIND=f'127.0.0.1:{port}',
+               SECRET_KEY=secrets.token_hex(32), DATABASE_URI='sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='cskin-bench-'), 'workers.db'))
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'main:app'], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not waitReady(port):
+            raise RuntimeError(f"gunicorn with {workers} workers did not start")
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        deadline = time.time() + seconds
+        processes = [context.Process(target=client, args=(port, deadline, results)) for _ in range(clients)]
+        for process in processes:
+            process.start()
+        ok, errors = [sum(values) for values in zip(*[results.get() for _ in processes])]
+        for process in processes:
+            process.join()
+        return ok / seconds, errors
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main(max_workers=None, seconds=10, clients=16):
+    max_workers = max_workers or os.cpu_count() or 1
+    print(f"{os.cpu_count()} CPUs, {clients} client processes, {seconds}s per run")
+    workers = 1
+    while True:
+        rate, errors = run(workers, seconds, clients)
+        print(f"{workers:3} workers {rate:10.0f} requests/s {errors:7} errors")
+        if workers >= max_workers:
+            break
+        workers = min(workers * 2, max_workers)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,41 @@
+""" gunicorn settings, read from the working directory by: gunicorn main:app
+
+The app is imported once in the master (preload_app) and warm booted there, so blueprints, compiled templates
+and seeded data are ready before workers fork. Each worker keeps per-process copies of table data that follow
+the shared table versions, see model/shared.py.
+
+    WEB_CONCURRENCY worker processes, the CPU count when unset
+    GUNICORN_THREADS request threads per worker
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8080')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+
+
+# warm boot once in the master, after the app is preloaded and before workers fork, WARM_BOOT=0 skips it
+# -- metrics of earlier runs are removed here only, see model/metrics.py
+def on_starting(server):
+    from __init__ import app
+    from model import metrics
+    from model.boot import warmBoot
+    metrics.removeEarlierRuns()
+    if app.config['WARM_BOOT']:
+        warmBoot()
+
+
+# connections opened by the warm boot are closed in the master, a forked worker never shares one
+def pre_fork(server, worker):
+    from __init__ import app, db
+    with app.app_context():
+        db.engine.dispose()
+
+
+# the worker drops any connection inherited from the master without closing it, the master owns it
+def post_fork(server, worker):
+    from __init__ import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,15 +1,21 @@
+import os
 import threading
 
+import click
+
+if __name__ == "__main__":  # the development server at the end runs in debug mode, see SECRET_KEY in __init__.py
+    os.environ.setdefault('FLASK_DEBUG', '1')
+
 # import "packages" from flask
 from flask import render_template  # import render_template from "public" flask libraries
 
 # import "packages" from "this" project
 from __init__ import app,db  # Definitions initialization
-from model.jokes import initJokes
-from model.users import initUsers
-from model.players import initPlayers
-from model.clients import initClients
-from model.skintypes import initSkinTypes
+from model.boot import warmBoot
+from model.sqlstats import initQueryStats
+from model.metrics import initMetrics
+from model.images import image_cache
+from model.skintypes import routine_cache
 
 # setup APIs
 from api.covid import covid_api # Blueprint import api definition
@@ -18,6 +24,10 @@ from api.user import user_api # Blueprint import api definition
 from api.player import player_api
 from api.client import client_api # Blueprint import api definition
 from api.skintype import skintype_api # Blueprint import api definition
+from api.upload import upload_api # Blueprint import uploaded content
+from api.admin import admin_api # Blueprint import cache statistics
+from api.conditional import response_cache
+from api.covid import covid_cache
 
 # setup App pages
 from projects.projects import app_projects # Blueprint directory import projects definition
@@ -30,6 +40,15 @@ app.register_blueprint(player_api)
 app.register_blueprint(app_projects) # register app pages
 app.register_blueprint(client_api) # register api routes
 app.register_blueprint(skintype_api) # register api routes
+app.register_blueprint(upload_api) # register uploaded content routes
+app.register_blueprint(admin_api) # register admin routes
+
+# SQL statement count and time of each request, in debug headers
+initQueryStats(app)
+
+# latency, SQL, upstream and cache metrics of every worker on /metrics
+initMetrics(app, caches={"responses": response_cache, "routines": routine_cache, "images": image_cache,
+                         "covid": covid_cache})
 
 @app.errorhandler(404)  # catch for URL not found
 def page_not_found(e):
@@ -44,22 +63,21 @@ def index():
 def stub():
     return render_template("stub.html")
 
-@app.before_first_request
-def activate_job():  # activate these items
-    db.init_app(app)
-    #Clear old database before create new database
-    db.drop_all()
-    db.create_all()
-    initJokes()
-    initUsers()
-    initPlayers()
-    initClients()
-    initSkinTypes()
+# warm boot at server start, so the first request is served as fast as any other
+# -- run by the gunicorn master (gunicorn.conf.py) and the development server below, not at import,
+#    so CLI commands and scripts importing main don't seed twice; WARM_BOOT=0 skips it at server start
+@app.cli.command('boot')
+@click.option('--reset', is_flag=True, help='Drop all tables before creating them.')
+def boot(reset):
+    """Create missing tables and indexes, then seed missing rows."""
+    warmBoot(reset)
 
 # this runs the application on the development server
 if __name__ == "__main__":
     # change name for testing
     from flask_cors import CORS
     cors = CORS(app)
+    if app.config['WARM_BOOT']:
+        warmBoot()
     app.run(debug=True, host="0.0.0.0", port="8080")
 
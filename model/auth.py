@@ -0,0 +1,144 @@
+""" signed login tokens, a password is checked once at login and later requests carry a token
+
+A token is the uid, a random token id and the issue time signed with SECRET_KEY (itsdangerous), checking one
+is an HMAC and a lookup in the in-memory revocations, no database query and no password hash.
+
+Revocations are rows of the revocations table, a single token (logout) or every token of a user issued before
+a time (logout everywhere, password change, user deleted). Each worker keeps them in memory and reloads them
+when the revocations version changed, checked at most every AUTH_REVOCATION_REFRESH seconds, so a revocation
+is immediate in the worker that made it and seen by every other worker within that delay.
+"""
+import functools
+import secrets
+import threading
+import time
+
+from flask_login import UserMixin, current_user, login_required
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from __init__ import app, db, login_manager
+from model.shared import VersionTracker
+
+token_serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='login-token')
+
+
+# Revoked token ids and users, rows expire once every token they revoke has expired
+class Revocation(db.Model):
+    __tablename__ = 'revocations'
+
+    key = db.Column(db.String(255), primary_key=True)  # 'token:<token id>' or 'user:<uid>'
+    before = db.Column(db.Float, nullable=False)  # tokens issued before this time are revoked
+    expires = db.Column(db.Float, nullable=False, index=True)
+
+
+# The user of a request with a valid token, built from the token alone
+class TokenUser(UserMixin):
+    def __init__(self, uid, token_id, issued):
+        self.id = uid
+        self.token_id = token_id
+        self.issued = issued
+
+    # seconds since epoch when the token stops being accepted
+    @property
+    def expires(self):
+        return self.issued + app.config['AUTH_TOKEN_TTL']
+
+
+# In-memory copy of the revocations table
+class Revocations:
+    def __init__(self, refresh):
+        self.refresh = refresh
+        self.tokens = set()
+        self.users = {}  # uid -> revoked before
+        self.checked = 0.0  # time of the last version check
+        self.version = VersionTracker(Revocation.__tablename__)
+        self._lock = threading.Lock()
+
+    # reload from the table when another worker revoked, at most once per refresh seconds
+    def sync(self):
+        now = time.time()
+        if now - self.checked < self.refresh:
+            return
+        with self._lock:
+            if now - self.checked < self.refresh:
+                return
+            if self.version.changed():
+                self.version.mark()
+                rows = db.session.query(Revocation.key, Revocation.before).filter(Revocation.expires > now).all()
+                self.tokens = {key[6:] for key, _ in rows if key.startswith('token:')}
+                self.users = {key[5:]: before for key, before in rows if key.startswith('user:')}
+            self.checked = now
+
+    def revoked(self, uid, token_id, issued):
+        self.sync()
+        return token_id in self.tokens or issued <= self.users.get(uid, 0.0)
+
+    # store a revocation and apply it in this worker at once, expired rows are removed
+    def revoke(self, key, before):
+        now = time.time()
+        expires = now + app.config['AUTH_TOKEN_TTL']
+        try:
+            db.session.query(Revocation).filter(Revocation.expires <= now).delete()
+            db.session.merge(Revocation(key=key, before=before, expires=expires))
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            raise
+        with self._lock:
+            if key.startswith('token:'):
+                self.tokens.add(key[6:])
+            else:
+                self.users[key[5:]] = max(before, self.users.get(key[5:], 0.0))
+
+
+revocations = Revocations(app.config['AUTH_REVOCATION_REFRESH'])
+
+
+# new signed token for uid, returns (token, TokenUser)
+def issueToken(uid):
+    user = TokenUser(uid, secrets.token_urlsafe(12), time.time())
+    return token_serializer.dumps({"u": uid, "t": user.token_id, "i": user.issued}), user
+
+
+# TokenUser of a valid, unexpired and unrevoked token, None otherwise
+def verifyToken(token):
+    try:
+        payload = token_serializer.loads(token, max_age=app.config['AUTH_TOKEN_TTL'])
+    except (BadSignature, SignatureExpired):
+        return None
+    if revocations.revoked(payload["u"], payload["t"], payload["i"]):
+        return None
+    return TokenUser(payload["u"], payload["t"], payload["i"])
+
+
+# logout of one token
+def revokeToken(user):
+    revocations.revoke('token:' + user.token_id, user.issued)
+
+
+# logout everywhere, every token of uid issued until now
+def revokeUser(uid):
+    revocations.revoke('user:' + uid, time.time())
+
+
+# flask_login: the user of a request from its Authorization: Bearer header or the AUTH_COOKIE cookie
+@login_manager.request_loader
+def loadRequestUser(request):
+    header = request.headers.get('Authorization', '')
+    token = header[7:] if header.startswith('Bearer ') else request.cookies.get(app.config['AUTH_COOKIE'])
+    return verifyToken(token) if token else None
+
+
+# view decorator, 401 without a valid token and 403 unless the token's uid is one of ADMIN_UIDS
+def admin_required(view):
+    @functools.wraps(view)
+    def checked(*args, **kwargs):
+        if current_user.id not in app.config['ADMIN_UIDS']:
+            return {'message': 'Admin access required'}, 403
+        return view(*args, **kwargs)
+    return login_required(checked)
+
+
+@login_manager.unauthorized_handler
+def unauthorized():
+    return {'message': 'Login required, authenticate at /api/users/authenticate'}, 401
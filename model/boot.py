@@ -0,0 +1,72 @@
+""" warm boot, prepares the database before the first request is served """
+import time
+
+from sqlalchemy import inspect
+
+from __init__ import app, db
+from model.jokes import initJokes
+from model.users import initUsers
+from model.players import initPlayers
+from model.clients import initClients
+from model.skintypes import initSkinTypes
+
+
+# Create missing tables and indexes, existing tables and their data are kept
+# -- a current schema costs one inspection and no DDL
+# returns a short description of what was done
+def initSchema(reset=False):
+    if reset:
+        db.drop_all()
+    inspector = inspect(db.engine)
+    existing = set(inspector.get_table_names())
+    missing = [table for table in db.metadata.sorted_tables if table.name not in existing]
+    if missing:
+        db.metadata.create_all(db.engine, tables=missing)
+    indexes = 0
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue  # created with its indexes above
+        names = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in names:
+                index.create(db.engine)
+                indexes += 1
+    if not missing and not indexes:
+        return "current"
+    return f"created {len(missing)} tables, {indexes} indexes"
+
+
+# Compile every template of the app and its blueprints into the Jinja cache
+# -- run after blueprints are registered, a preloading master then hands compiled templates to every worker
+def initTemplates():
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return f"{len(names)} templates"
+
+
+# Boot stages in order, each seeder only adds the rows that are missing
+boot_stages = [
+    ("schema", initSchema),
+    ("jokes", initJokes),
+    ("users", initUsers),
+    ("players", initPlayers),
+    ("clients", initClients),
+    ("skintypes", initSkinTypes),
+    ("templates", initTemplates)
+]
+
+
+# Run every boot stage, reset drops all tables first
+# returns [(stage, seconds, result)], each stage is also printed
+def warmBoot(reset=False):
+    timings = []
+    with app.app_context():
+        for name, stage in boot_stages:
+            start = time.perf_counter()
+            result = stage(reset) if stage is initSchema else stage()
+            elapsed = time.perf_counter() - start
+            timings.append((name, elapsed, result))
+            print(f"boot {name}: {elapsed * 1000:.1f}ms" + (f" ({result})" if result else ""))
+    print(f"boot total: {sum(elapsed for _, elapsed, _ in timings) * 1000:.1f}ms")
+    return timings
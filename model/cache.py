@@ -0,0 +1,268 @@
+""" in-process caches shared by models and APIs """
+from collections import OrderedDict
+from contextlib import contextmanager
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl  # POSIX only, without it refreshes are single flight per process
+except ImportError:
+    fcntl = None
+
+
+# Least Recently Used cache capped by total bytes of stored values
+# -- values are stored with their size, oldest entries are evicted when the cap is passed
+# -- hits, misses and evictions are counted so cache efficiency can be reported
+class LRUCache:
+    def __init__(self, max_bytes, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, size), most recently used at the end
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # lookup key, returns value or default, marks entry as recently used
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # store value under key, size is the number of bytes value accounts for
+    # values bigger than the whole cache are not stored
+    def set(self, key, value, size):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes or (self.max_entries and len(self._entries) > self.max_entries):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    # remove a single key, returns True when an entry was removed
+    def delete(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is None:
+                return False
+            self._bytes -= old[1]
+            return True
+
+    # remove every key that matches predicate, returns count removed
+    def discard(self, predicate):
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[1]
+            return len(keys)
+
+    # remove all entries, counters are preserved
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # statistics as a dictionary, ready for API response
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Single value cache refreshed from fetch(), serving the last good value while a refresh runs
+# -- fresh for ttl seconds, then served stale for up to stale more seconds while one background thread refreshes
+# -- older values (or no value yet) are refreshed in the request, concurrent callers wait for that one fetch
+# -- a failed fetch keeps the last good value and backs off exponentially before the next attempt
+# -- with a path, values are persisted as gzip JSON snapshots shared by every process using the same path:
+#    a new process serves a snapshot within ttl + stale at once, and a process only fetches when no other has just done so
+class RefreshingCache:
+    def __init__(self, fetch, ttl, stale, backoff=60, max_backoff=3600, path=None):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale = stale
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.value = None
+        self.fetched = None  # time.time() of value
+        self.failures = 0  # consecutive failed fetches
+        self.retry_at = 0.0  # no fetch is attempted before this time.time()
+        self.error = None  # last fetch exception
+        self.listeners = []  # called with each new value
+        self._lock = threading.Lock()  # held by the one fetch in progress
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.path = path
+        self._snapshot_mtime = None  # st_mtime_ns of the snapshot file last loaded or saved
+        if path is not None:
+            self.loadSnapshot()
+
+    # seconds since value was fetched, None without a value
+    def age(self):
+        return None if self.fetched is None else time.time() - self.fetched
+
+    # True when value is younger than ttl
+    def fresh(self):
+        age = self.age()
+        return age is not None and age < self.ttl
+
+    # current value, refreshing it as needed
+    # -- a snapshot value is aged from its fetch time like any other, older than ttl + stale it is refreshed first
+    # raises the last fetch error when no value was ever fetched
+    def get(self):
+        age = self.age()
+        if age is not None and age < self.ttl:
+            self.hits += 1
+            return self.value
+        if age is not None and (age < self.ttl + self.stale or time.time() < self.retry_at):
+            self.stale_hits += 1
+            self.refreshAsync()
+            return self.value
+        self.misses += 1
+        self.refresh()
+        if self.value is None:
+            raise self.error or LookupError("no value fetched")
+        return self.value
+
+    # replace value, listeners are told about it
+    def store(self, value, fetched=None):
+        self.value = value
+        self.fetched = time.time() if fetched is None else fetched
+        for listener in self.listeners:
+            listener(value)
+
+    # fetch a new value, returns True when value is fresh afterwards
+    # blocking waits for a fetch already in progress instead of returning at once
+    def refresh(self, blocking=True):
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            if self.fresh() or (self.loadSnapshot() and self.fresh()):
+                return True  # refreshed by the caller we waited for, or by another process
+            if time.time() < self.retry_at:
+                return False
+            with self._processLock(blocking) as locked:
+                if not locked:
+                    return False
+                if self.loadSnapshot() and self.fresh():
+                    return True  # another process fetched while we waited
+                try:
+                    value = self.fetch()
+                except Exception as error:
+                    self.error = error
+                    self.failures += 1
+                    self.retry_at = time.time() + min(self.backoff * 2 ** (self.failures - 1), self.max_backoff)
+                    return False
+                self.error = None
+                self.failures = 0
+                self.retry_at = 0.0
+                self.refreshes += 1
+                self.store(value)
+                self.saveSnapshot()
+                return True
+        finally:
+            self._lock.release()
+
+    # exclusive lock on path + '.lock' across processes, yields False when not blocking and already held
+    @contextmanager
+    def _processLock(self, blocking):
+        if self.path is None or fcntl is None:
+            yield True
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # load the snapshot at path when it changed since last seen and is newer than value
+    # returns True when value was replaced, a missing or unreadable snapshot is ignored
+    def loadSnapshot(self):
+        if self.path is None:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._snapshot_mtime:
+                return False
+            with gzip.open(self.path, 'rt', encoding='utf-8') as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            fetched, value = snapshot['fetched'], snapshot['value']
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self._snapshot_mtime = mtime
+        if self.fetched is not None and fetched <= self.fetched:
+            return False
+        self.store(value, fetched)
+        return True
+
+    # write value to path, replaced atomically so readers never see a partial snapshot
+    def saveSnapshot(self):
+        if self.path is None:
+            return
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+            try:
+                with os.fdopen(descriptor, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as snapshot_file:
+                    snapshot_file.write(json.dumps({"fetched": self.fetched, "value": self.value}).encode('utf-8'))
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            self._snapshot_mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            pass  # serving continues from memory, the next refresh tries to persist again
+
+    # start a background refresh unless one is running or failures are backing off
+    def refreshAsync(self):
+        if self._lock.locked() or time.time() < self.retry_at:
+            return
+        threading.Thread(target=self.refresh, kwargs={'blocking': False}, daemon=True).start()
+
+    # statistics as a dictionary, ready for API response
+    def stats(self):
+        return {
+            "age": self.age(),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "error": None if self.error is None else repr(self.error)
+        }
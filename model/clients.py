@@ -3,8 +3,13 @@ from random import randrange
 from datetime import date
 import os, base64
 import json
+import threading
 
 from __init__ import app, db
+from model.images import imagePayload
+from model.ingredients import IngredientIndex
+from model.similarity import SimilarityIndex
+from model.shared import VersionTracker
 from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -45,21 +50,15 @@ class Tost(db.Model):
             return None
 
     # CRUD read, returns dictionary representation of Notes object
+    # image is a cached URL reference, or base64 text when inline is requested
     # returns dictionary
-    def read(self):
-        # encode image
-        path = app.config['UPLOAD_FOLDER']
-        file = os.path.join(path, self.image)
-        file_text = open(file, 'rb')
-        file_read = file_text.read()
-        file_encode = base64.encodebytes(file_read)
-        
+    def read(self, inline=None):
         return {
             "id": self.id,
             "userID": self.userID,
             "note": self.note,
             "image": self.image,
-            "base64": str(file_encode)
+            **imagePayload(self.image, inline)
         }
 
 # Define the User class to manage actions in the 'users' table
@@ -139,46 +138,130 @@ class Client(db.Model):
             # creates a person object from User(db.Model) class, passes initializers
             db.session.add(self)  # add prepares to persist person object to Users table
             db.session.commit()  # SqlAlchemy "unit of work pattern" requires a manual commit
+            indexClient(self)
             return self
         except IntegrityError:
             db.session.remove()
             return None
 
-    # CRUD read converts self to dictionary
+    # columns or relationship each read() field is built from, lets a query load only requested fields
+    read_columns = {
+        "id": ["id"],
+        "product": ["_product"],
+        "ingredients": ["_ingredients"],
+        "date": ["_date"],
+        "skinType": ["_skinType"],
+        "tosts": ["tosts"]
+    }
+
+    # CRUD read converts self to dictionary, inline is passed on to child notes
+    # fields limits output to the named keys, others are never touched (or loaded)
     # returns dictionary
-    def read(self):
-        return {
-            "product": self._product,
-            "ingredients": self._ingredients,
-            "date": self._date,
-            "skinType": self._skinType,
-            "tosts": [tost.read() for tost in self.tosts],
+    def read(self, inline=None, fields=None):
+        readers = {
+            "id": lambda: self.id,
+            "product": lambda: self._product,
+            "ingredients": lambda: self._ingredients,
+            "date": lambda: self._date,
+            "skinType": lambda: self._skinType,
+            "tosts": lambda: [tost.read(inline) for tost in self.tosts]
         }
+        return {key: reader() for key, reader in readers.items() if fields is None or key in fields}
 
-    # CRUD update: updates user name, password, phone
+    # CRUD update: updates product, ingredients, skin type
     # returns self
-    def update(self, product=""):
+    def update(self, product="", ingredients="", skinType=""):
         """only updates values with length"""
         if len(product) > 0:
             self.product = product
+        if len(ingredients) > 0:
+            self.ingredients = ingredients
+        if len(skinType) > 0:
+            self.skinType = skinType
         db.session.commit()
+        indexClient(self)
         return self
 
     # CRUD delete: remove self
     # None
     def delete(self):
+        id = self.id
         db.session.delete(self)
         db.session.commit()
+        unindexClient(id)
         return None
 
 
+"""Client Indexes, built from the clients table on first use and kept current by Client CRUD
+  ingredient_index: posting lists of client ids by ingredient and skin type, see model/ingredients.py
+  similarity_indexes: nearest clients by shared ingredients for each metric, see model/similarity.py
+Each worker process keeps its own indexes, they are rebuilt when another worker changed the clients table,
+see model/shared.py
+"""
+ingredient_index = IngredientIndex()
+similarity_indexes = {metric: SimilarityIndex(metric, app.config['SIMILAR_MAX_K']) for metric in ('cosine', 'jaccard')}
+client_indexes_lock = threading.Lock()  # one build at a time
+client_version = VersionTracker('clients')  # version of the clients table the indexes were built at
+
+
+# drop every index when the clients table changed since they were built, call with client_indexes_lock
+def _syncClientIndexes():
+    if client_version.changed():
+        ingredient_index.invalidate()
+        for index in similarity_indexes.values():
+            index.invalidate()
+        client_version.mark()
+
+
+# the ingredient index, built on first use
+def getIngredientIndex():
+    with client_indexes_lock:
+        _syncClientIndexes()
+        if not ingredient_index.built:
+            ingredient_index.rebuild(db.session.query(Client.id, Client._ingredients, Client._skinType))
+    return ingredient_index
+
+
+# the similarity index of metric, built on first use, its neighbour table is filled in the background
+def getSimilarityIndex(metric):
+    index = similarity_indexes[metric]
+    with client_indexes_lock:
+        _syncClientIndexes()
+        if not index.built:
+            index.rebuild(db.session.query(Client.id, Client._ingredients))
+            if app.config['SIMILAR_PRECOMPUTE']:
+                threading.Thread(target=index.precompute, daemon=True).start()
+    return index
+
+
+# add or refresh client in every built index
+def indexClient(client):
+    ingredient_index.add(client.id, client._ingredients, client._skinType)
+    for index in similarity_indexes.values():
+        index.add(client.id, client._ingredients)
+    client_version.advance()
+
+
+# drop every index, they are rebuilt on next use, e.g. after rows were inserted without Client.create
+def invalidateClientIndexes():
+    ingredient_index.invalidate()
+    for index in similarity_indexes.values():
+        index.invalidate()
+
+
+# drop the client with id from every built index
+def unindexClient(id):
+    ingredient_index.remove(id)
+    for index in similarity_indexes.values():
+        index.remove(id)
+    client_version.advance()
+
+
 """Database Creation and Testing """
 
 
 # Builds working data for testing
 def initClients():
-    """Create database and tables"""
-    #db.create_all()
     """Tester data for table"""
     u1 = Client(product='Cetaphil Gentle Skin Cleanser', skinType='dry', ingredients='Water, Glycerin, Cocamidopropyl Betaine, Disodium Laureth Sulfosuccinate, Sodium Cocoamphoacetate, Panthenol, Niacinamide, Pantolactone, Acrylates/C10-30 Alkyl Acrylate Crosspolymer, Sodium Benzoate, Masking Fragrance, Sodium Chloride, Citric Acid', date='2023')
     u2 = Client(product='Alaffia Everyday Coconut Face Toner', skinType='dry', ingredients='Azadirachta indica (neem) leaf aqueous extract, Carica Papaya (Papaya) Leaf Aqueous Extract, Cocos Nucifera (Coconut) Water, Glycerin, Lavandula Hybrida (Lavender) Oil, Phenoxyethanol, Potassium Sorbate, Ascorbic Acid, Cocos Nucifera (Coconut) Extract', date='2023')
@@ -187,21 +270,20 @@ def initClients():
     u5 = Client(product='Paula’s Choice Pore-Reducing Toner', skinType='oily', ingredients='Water, Glycerin, Butylene Glycol, Niacinamide, Adenosine Triphosphate, Anthemis Nobilis (Chamomile) Flower Extract (anti-irritant), Arctium Lappa (Burdock) Root Extract, Hydrolyzed Jojoba Esters, Hydrolyzed Vegetable Protein, Sodium PCA, Panthenol, Sodium Hyaluronate, Sodium Chondroitin Sulfate, Ceramide 3, Ceramide 6 II, Ceramide 1, Phytosphingosine, Cholesterol, Tetrahexyldecyl Ascorbate, Oleth-10, DEA-Oleth-10 Phosphate, Sodium Lauroyl Lactylate, Polysorbate-20, Caprylyl Glycol, Hexylene Glycol, Sodium Citrate, Xanthan Gum, Trisodium EDTA, Phenoxyethanol', date='2023')
     u6 = Client(product='Drunk Elephant Beste No. 9 Jelly Cleanser', skinType='oily',ingredients='Water/Aqua/Eau, Glycerin, Cocamidopropyl Betaine, Coco-Glucoside, Sodium Lauroyl Methyl Isethionate, Cocamidopropyl Hydroxysultaine, Sodium Methyl Oleoyl Taurate, Propanediol, Aloe Barbadensis Leaf Extract, Glycolipids, Linoleic Acid, Linolenic Acid, Lauryl Glucoside, Cucumis Melo Cantalupensis Fruit Extract, Sclerocarya Birrea Seed Oil, Dipotassium Glycyrrhizate, Tocopherol, Citric Acid, Phenoxyethanol, Sodium Hydroxide, Sodium Benzoate, Sodium Chloride, Polylysine', date='2023')
 
-    clients = [u1, u2, u3, u4, u5, u6]
+    existing = {product for (product,) in db.session.query(Client._product)}
+    clients = [client for client in [u1, u2, u3, u4, u5, u6] if client.product not in existing]
 
     """Builds sample user/note(s) data"""
     for client in clients:
-        try:
-            '''add a few 1 to 4 notes per user'''
-            for num in range(randrange(1, 4)):
-                note = "#### " + client.product + " note " + str(num) + ". \n Generated by test data."
-                client.tosts.append(Tost(id=client.id, note=note, image='ncs_logo.png'))
-            '''add user/post data to table'''
-            client.create()
-        except IntegrityError:
-            '''fails with bad or duplicate data'''
-            db.session.remove()
-            print(f"Records exist, duplicate email, or error: {client.uid}")
-
-
-
+        '''add a few 1 to 4 notes per user'''
+        for num in range(randrange(1, 4)):
+            note = "#### " + client.product + " note " + str(num) + ". \n Generated by test data."
+            client.tosts.append(Tost(id=client.id, note=note, image='ncs_logo.png'))
+    '''add user/post data to table in one transaction'''
+    db.session.add_all(clients)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        '''fails with bad or duplicate data'''
+        db.session.rollback()
+        print(f"Records exist, duplicate email, or error: {', '.join(client.product for client in clients)}")
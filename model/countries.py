@@ -0,0 +1,82 @@
+""" indexed queries over the countries_stat list of the COVID API response """
+from bisect import bisect_left
+import difflib
+import math
+
+import numpy as np
+
+
+# normalized form of a country name used by every lookup, e.g. " South  Korea" -> "south korea"
+def normalizeName(name):
+    return ' '.join(name.casefold().split())
+
+
+# number of an upstream string field, e.g. "1,234,567" -> 1234567.0, NaN for "", "N/A" and other text
+def parseNumber(text):
+    try:
+        return float(str(text).replace(',', ''))
+    except ValueError:
+        return math.nan
+
+
+# Country statistics parsed once, answering lookups without scanning or re-parsing the payload
+# -- by_name maps normalized names to rows, prefix search bisects the sorted names
+# -- every numeric field is a NumPy column with a precomputed descending order, so top-n is a slice
+#    and range filters are two binary searches over the sorted column
+class CountryIndex:
+    def __init__(self, payload):
+        self.source = payload  # the response this index was built from
+        self.countries = [country for country in payload.get('countries_stat', []) if country.get('country_name')]
+        names = [normalizeName(country['country_name']) for country in self.countries]
+        self.by_name = {name: row for row, name in enumerate(names)}
+        self.sorted_names = sorted(self.by_name)
+        self.columns = {}
+        self.orders = {}  # metric -> row numbers by descending value, NaN rows excluded
+        self.negated = {}  # metric -> negated values in orders[metric] order, ascending for searchsorted
+        fields = {key for country in self.countries for key in country} - {'country_name', 'region'}
+        for field in sorted(fields):
+            column = np.array([parseNumber(country.get(field, '')) for country in self.countries], dtype=np.float64)
+            if np.isnan(column).all():
+                continue  # text field, not a metric
+            rows = np.flatnonzero(~np.isnan(column))
+            self.columns[field] = column
+            self.orders[field] = rows[np.argsort(-column[rows], kind='stable')]
+            self.negated[field] = -column[self.orders[field]]
+
+    # names of the numeric fields
+    def metrics(self):
+        return list(self.columns)
+
+    # country with exactly this name, case and spacing insensitive, None when not found
+    def lookup(self, name):
+        row = self.by_name.get(normalizeName(name))
+        return None if row is None else self.countries[row]
+
+    # up to n countries whose name starts with prefix, in name order
+    def prefix(self, prefix, n=10):
+        prefix = normalizeName(prefix)
+        start = bisect_left(self.sorted_names, prefix)
+        found = []
+        for name in self.sorted_names[start:start + n]:
+            if not name.startswith(prefix):
+                break
+            found.append(self.countries[self.by_name[name]])
+        return found
+
+    # up to n countries with names close to name, best match first
+    def fuzzy(self, name, n=5, cutoff=0.6):
+        matches = difflib.get_close_matches(normalizeName(name), self.sorted_names, n=n, cutoff=cutoff)
+        return [self.countries[self.by_name[match]] for match in matches]
+
+    # n countries with the highest (or lowest) value of metric
+    def top(self, metric, n=10, ascending=False):
+        order = self.orders[metric]
+        rows = order[::-1][:n] if ascending else order[:n]
+        return [self.countries[row] for row in rows]
+
+    # countries with minimum <= metric <= maximum, either bound may be None, highest value first
+    def range(self, metric, minimum=None, maximum=None):
+        order, values = self.orders[metric], self.negated[metric]
+        start = 0 if maximum is None else np.searchsorted(values, -maximum, side='left')
+        stop = len(order) if minimum is None else np.searchsorted(values, -minimum, side='right')
+        return [self.countries[row] for row in order[start:stop]]
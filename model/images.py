@@ -0,0 +1,66 @@
+""" image payloads for uploaded content, shared by Post and Tost """
+import os, base64
+import hashlib
+
+from __init__ import app
+from model.cache import LRUCache
+
+
+# Encoded images are cached by path, modification time and size
+# -- a changed or replaced file gets a new key, so stale payloads are never served
+image_cache = LRUCache(app.config['IMAGE_CACHE_BYTES'])
+
+
+# full path of an uploaded image
+def imagePath(image):
+    return os.path.join(app.config['UPLOAD_FOLDER'], image)
+
+
+# cache key for image, changes whenever the file on disk changes
+def imageKey(image):
+    path = imagePath(image)
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+# base64 text of image, as returned by read() of Post and Tost
+def encodeImage(image):
+    key = imageKey(image)
+    file_encode = image_cache.get(key)
+    if file_encode is None:
+        with open(key[0], 'rb') as file_text:  # closed even when read or encode fails
+            file_read = file_text.read()
+        file_encode = str(base64.encodebytes(file_read))
+        image_cache.set(key, file_encode, len(file_encode))
+    return file_encode
+
+
+# Content digests are cached under the same key, computing one reads the whole file
+digest_cache = LRUCache(1024 * 1024)
+
+
+# short content hash of image, stable for as long as the file is unchanged
+def imageDigest(image):
+    key = imageKey(image)
+    digest = digest_cache.get(key)
+    if digest is None:
+        with open(key[0], 'rb') as file_text:
+            digest = hashlib.sha256(file_text.read()).hexdigest()[:16]
+        digest_cache.set(key, digest, len(digest))
+    return digest
+
+
+# content addressed URL of image, served by the upload_api blueprint
+# -- the URL changes whenever the content changes, so clients can cache it forever
+def imageURL(image):
+    return app.config['UPLOAD_URL'] + '/' + imageDigest(image) + '/' + image
+
+
+# image fields of Post and Tost read(), inline base64 or URL reference
+# inline of None follows app.config['IMAGE_DELIVERY']
+def imagePayload(image, inline=None):
+    if inline is None:
+        inline = app.config['IMAGE_DELIVERY'] == 'inline'
+    if inline:
+        return {"base64": encodeImage(image)}
+    return {"url": imageURL(image)}
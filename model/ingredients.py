@@ -0,0 +1,120 @@
+""" inverted index of client ingredients, answering ingredient queries without scanning the clients table """
+from functools import lru_cache
+import heapq
+import re
+import threading
+
+
+# normalized tokens of a comma separated ingredient list
+# -- each ingredient is casefolded with spacing collapsed, slash alternatives and parenthesized names are tokens too
+#    e.g. "Water/Aqua/Eau, Persea Gratissima (Avocado) Oil" ->
+#    {"water", "aqua", "eau", "persea gratissima oil", "avocado"}
+def ingredientTokens(ingredients):
+    tokens = set()
+    for ingredient in (ingredients or '').split(','):
+        tokens.update(ingredientNames(ingredient))
+    return tokens
+
+
+# tokens of one ingredient, cached as catalogs repeat the same ingredients across products
+@lru_cache(maxsize=65536)
+def ingredientNames(ingredient):
+    names = re.findall(r'\(([^)]*)\)', ingredient) if '(' in ingredient else []  # common names, e.g. (Avocado)
+    names.append(re.sub(r'\([^)]*\)', ' ', ingredient) if names else ingredient)
+    tokens = (normalizeToken(alternative) for name in names for alternative in name.split('/'))
+    return tuple(token for token in tokens if token)
+
+
+# normalized form of one ingredient or skin type, e.g. " Niacinamide " -> "niacinamide"
+def normalizeToken(text):
+    return ' '.join(text.casefold().split())
+
+
+# Posting lists of client ids per ingredient token and per skin type
+# -- queries combine posting lists with set operations, starting from the smallest, so cost follows
+#    the size of the lists involved and not the size of the catalog
+# -- kept current by add/remove as clients change, built from the table on first use or after invalidate
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.invalidate()
+
+    # forget all postings, the next query rebuilds them
+    def invalidate(self):
+        with self._lock:
+            self.built = False
+            self.postings = {}  # token -> set of ids
+            self.skin_types = {}  # normalized skin type -> set of ids
+            self.entries = {}  # id -> (tokens, skin type), to undo postings on change
+
+    # replace all postings from (id, ingredients, skinType) rows
+    def rebuild(self, rows):
+        with self._lock:
+            self.invalidate()
+            for id, ingredients, skinType in rows:
+                self._add(id, ingredients, skinType)
+            self.built = True
+
+    def _add(self, id, ingredients, skinType):
+        tokens = ingredientTokens(ingredients)
+        skin_type = normalizeToken(skinType or '')
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(id)
+        self.skin_types.setdefault(skin_type, set()).add(id)
+        self.entries[id] = (tokens, skin_type)
+
+    # index a new or changed client, ignored until the index is built
+    def add(self, id, ingredients, skinType):
+        with self._lock:
+            if not self.built:
+                return
+            self._remove(id)
+            self._add(id, ingredients, skinType)
+
+    def _remove(self, id):
+        entry = self.entries.pop(id, None)
+        if entry is None:
+            return
+        tokens, skin_type = entry
+        for token in tokens:
+            posting = self.postings[token]
+            posting.discard(id)
+            if not posting:
+                del self.postings[token]
+        self.skin_types[skin_type].discard(id)
+        if not self.skin_types[skin_type]:
+            del self.skin_types[skin_type]
+
+    # drop a deleted client, ignored until the index is built
+    def remove(self, id):
+        with self._lock:
+            if self.built:
+                self._remove(id)
+
+    # ids of clients with every ingredient of all, at least one of any, none of none and one of skinTypes
+    # empty arguments do not filter, returns a set
+    def search(self, all=(), any=(), none=(), skinTypes=()):
+        with self._lock:
+            groups = [self.postings.get(normalizeToken(token), set()) for token in all]
+            if any:
+                groups.append(set().union(*(self.postings.get(normalizeToken(token), set()) for token in any)))
+            if skinTypes:
+                groups.append(set().union(*(self.skin_types.get(normalizeToken(skin), set()) for skin in skinTypes)))
+            if groups:
+                groups.sort(key=len)
+                found = groups[0].intersection(*groups[1:])
+            else:
+                found = set(self.entries)  # only exclusions, start from every client
+            for token in none:
+                found = found - self.postings.get(normalizeToken(token), set())
+            return found
+
+    # up to limit ids of found greater than after, ascending, without sorting all of found
+    @staticmethod
+    def page(found, limit, after=None):
+        if after is not None:
+            found = (id for id in found if id > after)
+        return heapq.nsmallest(limit, found)
+
+    def __len__(self):
+        return len(self.entries)
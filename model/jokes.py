@@ -1,6 +1,16 @@
+import atexit
+import os
 import random
+import threading
 
-jokes_data = []
+from sqlalchemy import text
+
+from __init__ import app, db
+from model.ranking import RankIndex
+from model.shared import bumpVersions, tableVersion
+
+jokes_data = []  # jokes with vote totals as persisted at the last flush
+joke_rankings = {'haha': RankIndex(), 'boohoo': RankIndex()}  # merged vote totals, kept current by every vote
 joke_list = [
     "If you give someone a program... you will frustrate them for a day; if you teach them how to program... you will "
     "frustrate them for a lifetime.",
@@ -24,63 +34,229 @@ joke_list = [
     'An SQL statement walks into a bar and sees two tables. It approaches, and asks may I join you?'
 ]
 
+# Define the Joke class to persist vote totals in the 'jokes' table
+# -- votes are counted by joke_votes and written in batches, the table is never updated one vote at a time
+class Joke(db.Model):
+    __tablename__ = 'jokes'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    joke = db.Column(db.Text, nullable=False)
+    haha = db.Column(db.Integer, nullable=False, default=0)
+    boohoo = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Vote counter accumulating increments in memory and flushing them in batches
+# -- a flush runs UPDATE jokes SET <column> = <column> + :delta for every pending id in one transaction and bumps
+#    the jokes version, then reloads the totals when the version moved, so votes flushed by other workers
+#    become visible, see model/shared.py
+# -- flushes happen every interval seconds, or sooner once threshold votes are pending, in each worker process
+#    that served a joke, never in a preloading master
+# -- reads merge the persisted totals with the pending deltas, so a vote is visible at once
+# -- joke_rankings follow the merged totals, updated per vote and for rows another worker changed
+class VoteCounter:
+    columns = ('haha', 'boohoo')
+
+    def __init__(self, interval, threshold):
+        self.interval = interval
+        self.threshold = threshold
+        self.pending = {}  # (id, column) -> votes not yet flushed
+        self.pending_count = 0
+        self.flushing = {}  # votes being written, counted until the reloaded totals include them
+        self._lock = threading.Lock()  # guards pending
+        self._flush_lock = threading.Lock()  # one flush at a time
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None  # process that started _thread, a forked worker starts its own
+        self.version = None  # version of the jokes table in jokes_data
+
+    # count one vote, returns the merged total of column for id
+    def add(self, id, column):
+        with self._lock:
+            key = (id, column)
+            self.pending[key] = self.pending.get(key, 0) + 1
+            self.pending_count += 1
+            if self.pending_count >= self.threshold:
+                self._wake.set()
+            total = self.total(id, column)
+            joke_rankings[column].set(id, total)
+        return total
+
+    # votes of column for id not yet in jokes_data, the caller holds _lock
+    def delta(self, id, column):
+        return self.pending.get((id, column), 0) + self.flushing.get((id, column), 0)
+
+    # persisted plus pending votes of column for id, the caller holds _lock
+    def total(self, id, column):
+        return jokes_data[id][column] + self.delta(id, column)
+
+    # joke id of jokes_data with the votes not yet in it
+    # -- read under _lock, a flush in progress is then counted once: in flushing or in the reloaded totals
+    def read(self, id):
+        with self._lock:
+            joke = dict(jokes_data[id])
+            for column in self.columns:
+                joke[column] += self.delta(id, column)
+        return joke
+
+    # write pending votes in one transaction and reload totals when changed, returns number of votes written
+    # on failure the votes are put back into pending, nothing is lost
+    def flush(self):
+        global jokes_data
+        with self._flush_lock:
+            with self._lock:
+                batch = self.flushing = self.pending
+                self.pending, self.pending_count = {}, 0
+            try:
+                with app.app_context():
+                    with db.engine.begin() as connection:
+                        for column in self.columns:
+                            rows = [{"id": id, "delta": delta} for (id, name), delta in batch.items() if name == column]
+                            if rows:
+                                connection.execute(text(f"UPDATE jokes SET {column} = {column} + :delta WHERE id = :id"), rows)
+                        if batch:
+                            bumpVersions(connection, Joke.__tablename__)
+                        version = tableVersion(Joke.__tablename__, connection)
+                    totals = readJokes() if version != self.version else None
+            except Exception:
+                with self._lock:
+                    for key, delta in batch.items():
+                        self.pending[key] = self.pending.get(key, 0) + delta
+                        self.pending_count += delta
+                    self.flushing = {}
+                raise
+            if totals is None:  # no votes anywhere since the last reload
+                with self._lock:
+                    self.flushing = {}
+                return 0
+            changed = None
+            if len(totals) == len(jokes_data):
+                changed = [joke['id'] for old, joke in zip(jokes_data, totals)
+                           if old['haha'] != joke['haha'] or old['boohoo'] != joke['boohoo']]
+            with self._lock:  # readers see either old totals plus flushing or new totals, never both
+                jokes_data = totals
+                self.version = version
+                self.flushing = {}
+                if changed is None:
+                    rankJokes()
+                for id in changed or []:
+                    for column in self.columns:
+                        joke_rankings[column].set(id, self.total(id, column))
+            return sum(batch.values())
+
+    # flush loop of the background thread
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as error:
+                app.logger.warning("joke votes not flushed, retrying: %r", error)
+
+    # start the background flush thread in this process if not running
+    def start(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._thread = threading.Thread(target=self._run, name='joke-votes', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+
+joke_votes = VoteCounter(interval=app.config['JOKE_VOTES_FLUSH_INTERVAL'],
+                         threshold=app.config['JOKE_VOTES_FLUSH_THRESHOLD'])
+
+
+# votes still pending when the process exits are flushed
+@atexit.register
+def flushJokeVotes():
+    if joke_votes.pending_count:
+        try:
+            joke_votes.flush()
+        except Exception:
+            pass
+
+
+# Jokes with persisted vote totals from the jokes table
+def readJokes():
+    rows = db.session.execute(text("SELECT id, joke, haha, boohoo FROM jokes ORDER BY id"))
+    return [{"id": id, "joke": joke, "haha": haha, "boohoo": boohoo} for id, joke, haha, boohoo in rows]
+
+# Rebuild joke_rankings from jokes_data and pending votes
+def rankJokes():
+    for column, ranking in joke_rankings.items():
+        ranking.rebuild({joke['id']: joke[column] + joke_votes.delta(joke['id'], column) for joke in jokes_data})
+
+# Reload jokes_data from the jokes table
+def loadJokes():
+    global jokes_data
+    joke_votes.version = tableVersion(Joke.__tablename__)
+    jokes_data = readJokes()
+    rankJokes()
+
+
 # Initialize jokes
 def initJokes():
-    # setup jokes into a dictionary with id, joke, haha, boohoo
-    item_id = 0
-    for item in joke_list:
-        jokes_data.append({"id": item_id, "joke": item, "haha": 0, "boohoo": 0})
-        item_id += 1
-    # prime some haha responses
-    for i in range(10):
-        id = getRandomJoke()['id']
-        addJokeHaHa(id)
-    # prime some haha responses
-    for i in range(5):
-        id = getRandomJoke()['id']
-        addJokeBooHoo(id)
+    with app.app_context():
+        # setup jokes into the jokes table with id, joke, haha, boohoo, existing vote totals are kept
+        existing = {id for (id,) in db.session.query(Joke.id)}
+        new = [Joke(id=item_id, joke=item) for item_id, item in enumerate(joke_list) if item_id not in existing]
+        db.session.add_all(new)
+        db.session.commit()
+        loadJokes()
+        if existing:
+            return
+        # prime some haha responses, counted and flushed here without starting the flush thread
+        for i in range(10):
+            id = random.choice(jokes_data)['id']
+            joke_votes.add(id, 'haha')
+        # prime some haha responses
+        for i in range(5):
+            id = random.choice(jokes_data)['id']
+            joke_votes.add(id, 'boohoo')
+        joke_votes.flush()
         
-# Return all jokes from jokes_data
+# Return all jokes from jokes_data, with pending votes
 def getJokes():
-    return(jokes_data)
+    return([getJoke(joke['id']) for joke in jokes_data])
 
-# Joke getter
+# Joke getter, with pending votes
+# -- starts the flush thread of this process, which also follows votes of other workers
 def getJoke(id):
-    return(jokes_data[id])
+    joke_votes.start()
+    return(joke_votes.read(id))
 
 # Return random joke from jokes_data
 def getRandomJoke():
-    return(random.choice(jokes_data))
+    return(getJoke(random.choice(jokes_data)['id']))
+
+# Jokes with the most votes of column ('haha' or 'boohoo'), only jokes with votes
+def topJokes(column, n):
+    return [getJoke(id) for id, count in joke_rankings[column].top(n)]
+
+# Rank of joke id by column, 1 is the most voted, ties share a rank
+def rankJoke(id, column):
+    return joke_rankings[column].rank(id)
 
-# Liked joke
+# Liked joke, None when no joke has a haha
 def favoriteJoke():
-    best = 0
-    bestID = -1
-    for joke in getJokes():
-        if joke['haha'] > best:
-            best = joke['haha']
-            bestID = joke['id']
-    return jokes_data[bestID]
+    best = topJokes('haha', 1)
+    return best[0] if best else None
     
-# Jeered joke
+# Jeered joke, None when no joke has a boohoo
 def jeeredJoke():
-    worst = 0
-    worstID = -1
-    for joke in getJokes():
-        if joke['boohoo'] > worst:
-            worst = joke['boohoo']
-            worstID = joke['id']
-    return jokes_data[worstID]
+    worst = topJokes('boohoo', 1)
+    return worst[0] if worst else None
 
 # Add to haha for requested id
 def addJokeHaHa(id):
-    jokes_data[id]['haha'] = jokes_data[id]['haha'] + 1
-    return jokes_data[id]['haha']
+    getJoke(id)  # IndexError for unknown id, as before
+    return joke_votes.add(id, 'haha')
 
 # Add to boohoo for requested id
 def addJokeBooHoo(id):
-    jokes_data[id]['boohoo'] = jokes_data[id]['boohoo'] + 1
-    return jokes_data[id]['boohoo']
+    getJoke(id)  # IndexError for unknown id, as before
+    return joke_votes.add(id, 'boohoo')
 
 # Pretty Print joke
 def printJoke(joke):
@@ -92,15 +268,19 @@ def countJokes():
 
 # Test Joke Model
 if __name__ == "__main__": 
+    with app.app_context():
+        db.create_all()
     initJokes()  # initialize jokes
     
     # Most likes and most jeered
     best = favoriteJoke()
-    print("Most liked", best['haha'])
-    printJoke(best)
+    if best is not None:
+        print("Most liked", best['haha'])
+        printJoke(best)
     worst = jeeredJoke()
-    print("Most jeered", worst['boohoo'])
-    printJoke(worst)
+    if worst is not None:
+        print("Most jeered", worst['boohoo'])
+        printJoke(worst)
     
     # Random joke
     print("Random joke")
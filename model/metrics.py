@@ -0,0 +1,236 @@
+""" Prometheus metrics of requests, SQL, upstream calls and caches, summed over every worker process
+
+Each process counts in memory and writes its values to a JSON file of METRICS_DIR/<run>/, at most every
+METRICS_WRITE_INTERVAL seconds and whenever it serves /metrics. The run is named once by the process that built
+the app, a preloading gunicorn master, from the start time and its pid, so its workers share one directory and a
+restarted container (master pid 1 again) starts a new one. /metrics sums the files of the run: counters and
+histograms of exited workers are kept so totals never go back, their gauges are dropped.
+Directories of earlier runs are removed by the gunicorn master when it starts (gunicorn.conf.py), never by other
+processes importing the app, e.g. flask commands or benchmarks next to a live server.
+"""
+import atexit
+import bisect
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from flask import Response, g, request
+
+from model.sqlstats import queryCount, queryTime
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help), every metric that can be exported
+metric_types = {
+    "http_requests_total": ("counter", "Requests by endpoint, method and status."),
+    "http_request_duration_seconds": ("histogram", "Request latency by endpoint and method."),
+    "http_request_sql_queries_total": ("counter", "SQL statements executed by requests, by endpoint."),
+    "http_request_sql_seconds": ("histogram", "Time in SQL statements per request, by endpoint."),
+    "upstream_requests_total": ("counter", "Calls to upstream APIs by upstream and outcome."),
+    "upstream_request_duration_seconds": ("histogram", "Upstream API call latency."),
+    "cache_hits_total": ("counter", "Cache lookups answered from the cache."),
+    "cache_stale_hits_total": ("counter", "Cache lookups answered with a stale value while refreshing."),
+    "cache_misses_total": ("counter", "Cache lookups that were not in the cache."),
+    "cache_evictions_total": ("counter", "Entries evicted to stay under the cache memory cap."),
+    "cache_refreshes_total": ("counter", "Values fetched again by a refreshing cache."),
+    "cache_bytes": ("gauge", "Bytes held by a cache."),
+    "cache_entries": ("gauge", "Entries held by a cache.")
+}
+
+# cache stats() keys exported as metrics
+cache_stat_metrics = {"hits": "cache_hits_total", "stale_hits": "cache_stale_hits_total",
+                      "misses": "cache_misses_total", "evictions": "cache_evictions_total",
+                      "refreshes": "cache_refreshes_total", "bytes": "cache_bytes", "entries": "cache_entries"}
+
+
+# Counters and histograms of this process, by metric name and labels
+# -- collectors are functions returning (name, labels, value) samples read when values are written,
+#    e.g. the statistics a cache already keeps
+class Metrics:
+    def __init__(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        self.values = {}  # (name, labels) -> number, labels a sorted tuple of (label, value)
+        self.histograms = {}  # (name, labels) -> [count per bucket..., count above the last, sum]
+        self.buckets = {}  # histogram name -> upper bounds
+        self.collectors = []
+        self.written = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.buckets[name] = buckets
+            counts = self.histograms.get(key)
+            if counts is None:
+                counts = self.histograms[key] = [0] * (len(buckets) + 2)
+            counts[bisect.bisect_left(buckets, value)] += 1
+            counts[-1] += value
+
+    # values of this process as JSON data
+    def snapshot(self):
+        samples = [(name, labels, value) for collect in self.collectors for name, labels, value in collect()]
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "values": [[name, list(labels), value] for (name, labels), value in self.values.items()] +
+                          [[name, sorted(labels.items()), value] for name, labels, value in samples],
+                "histograms": [[name, list(labels), self.buckets[name], counts]
+                               for (name, labels), counts in self.histograms.items()]
+            }
+
+    # write the snapshot of this process, replacing its previous file at once
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        data = json.dumps(self.snapshot())
+        descriptor, path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(data)
+        os.replace(path, os.path.join(self.directory, f'worker-{os.getpid()}.json'))
+        self.written = time.time()
+
+    # write when the last write is older than interval, or always when forced
+    def maybeWrite(self, force=False):
+        if force or time.time() - self.written >= self.interval:
+            try:
+                self.write()
+            except OSError:
+                pass
+
+
+# sum the files of directory, returns (values, histograms) like Metrics but over every process
+def aggregate(directory):
+    values, histograms, buckets = {}, {}, {}
+    for entry in os.listdir(directory) if os.path.isdir(directory) else []:
+        if not entry.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, entry)) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            continue  # removed or replaced while reading
+        alive = processAlive(data["pid"])
+        for name, labels, value in data["values"]:
+            if metric_types[name][0] == "gauge" and not alive:
+                continue
+            key = (name, tuple(tuple(label) for label in labels))
+            values[key] = values.get(key, 0) + value
+        for name, labels, bounds, counts in data["histograms"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            buckets[name] = bounds
+            total = histograms.setdefault(key, [0] * len(counts))
+            for index, count in enumerate(counts):
+                total[index] += count
+    return values, histograms, buckets
+
+
+def processAlive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labelText(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+# Prometheus text exposition format of aggregated values
+def render(values, histograms, buckets):
+    lines = []
+    for name, (kind, help) in metric_types.items():
+        samples = sorted((key, value) for key, value in values.items() if key[0] == name)
+        series = sorted((key, counts) for key, counts in histograms.items() if key[0] == name)
+        if not samples and not series:
+            continue
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (_, labels), value in samples:
+            lines.append(f'{name}{_labelText(labels)} {value}')
+        for (_, labels), counts in series:
+            cumulative = 0
+            for bound, count in zip(buckets[name], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labelText(labels, [("le", bound)])} {cumulative}')
+            cumulative += counts[-2]
+            lines.append(f'{name}_bucket{_labelText(labels, [("le", "+Inf")])} {cumulative}')
+            lines.append(f'{name}_sum{_labelText(labels)} {counts[-1]}')
+            lines.append(f'{name}_count{_labelText(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+metrics = None  # Metrics of this process, set by initMetrics
+
+
+# record one call to upstream, outcome is e.g. 'ok' or 'error'
+def observeUpstream(upstream, seconds, outcome):
+    if metrics is not None:
+        metrics.inc("upstream_requests_total", {"upstream": upstream, "outcome": outcome})
+        metrics.observe("upstream_request_duration_seconds", {"upstream": upstream}, seconds)
+
+
+# remove the directories of every run but the one of this process, called by the server master at start
+# -- a pid may be alive again after a restart, so runs are removed whatever their pid
+def removeEarlierRuns():
+    root = os.path.dirname(metrics.directory)
+    for entry in os.listdir(root) if os.path.isdir(root) else []:
+        path = os.path.join(root, entry)
+        if path != metrics.directory and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# Record every request of app and serve /metrics
+# -- caches maps a cache label to an object with stats(), e.g. LRUCache or RefreshingCache
+def initMetrics(app, caches):
+    global metrics
+    root = app.config['METRICS_DIR']
+    run = f'{time.time_ns()}-{os.getpid()}'
+    metrics = Metrics(os.path.join(root, run), app.config['METRICS_WRITE_INTERVAL'])
+
+    def collectCaches():
+        for label, cache in caches.items():
+            for key, value in cache.stats().items():
+                if key in cache_stat_metrics and isinstance(value, (int, float)):
+                    yield cache_stat_metrics[key], {"cache": label}, value
+    metrics.collectors.append(collectCaches)
+
+    @app.before_request
+    def metrics_start():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def metrics_record(response):
+        start = g.pop('metrics_start', None)
+        if start is None or request.endpoint == 'metrics':  # scrapes are not counted
+            return response
+        endpoint = request.endpoint or 'none'
+        labels = {"endpoint": endpoint, "method": request.method}
+        metrics.inc("http_requests_total", {**labels, "status": str(response.status_code)})
+        metrics.observe("http_request_duration_seconds", labels, time.perf_counter() - start)
+        metrics.inc("http_request_sql_queries_total", {"endpoint": endpoint}, queryCount())
+        metrics.observe("http_request_sql_seconds", {"endpoint": endpoint}, queryTime())
+        metrics.maybeWrite()
+        return response
+
+    @app.route('/metrics', endpoint='metrics')
+    def metrics_text():
+        metrics.write()
+        return Response(render(*aggregate(metrics.directory)), mimetype='text/plain; version=0.0.4')
+
+    atexit.register(metrics.maybeWrite, force=True)  # last values of an exiting worker
+    return metrics
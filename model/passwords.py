@@ -0,0 +1,114 @@
+""" password hashing and checking in a bounded process pool, off the request threads """
+from concurrent.futures import ProcessPoolExecutor
+import os
+import threading
+
+from flask import has_request_context, jsonify
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+from __init__ import app
+
+
+# Raised when the pool queue is full, a 503 JSON response with a Retry-After header
+# -- the response is built here, so flask_restful returns it as is instead of logging a server error
+class PasswordPoolBusy(ServiceUnavailable):
+    description = 'Too many password checks in progress, try again later'
+
+    def __init__(self, retry_after):
+        response = jsonify(message=self.description)
+        response.status_code = self.code
+        response.headers['Retry-After'] = str(retry_after)
+        super().__init__(response=response, retry_after=retry_after)
+
+
+# method as werkzeug writes it at the start of a hash, e.g. pbkdf2:sha256 -> pbkdf2:sha256:<default iterations>
+def storedMethod(method):
+    if not method.startswith('pbkdf2:'):
+        return method
+    name, colon, iterations = method[7:].partition(':')
+    return f"pbkdf2:{name}:{int(iterations or 0) if colon else DEFAULT_PBKDF2_ITERATIONS}"
+
+
+# Process pool running werkzeug hashing, so CPU bound hashes run in parallel and do not hold the GIL
+# -- at most workers + queue calls are in flight, callers beyond that get PasswordPoolBusy at once
+# -- calls outside of a request (boot, CLI, scripts) and a pool of 0 workers hash in the calling thread
+# -- the executor is created on first use in each process, so forked gunicorn workers get their own
+class PasswordPool:
+    def __init__(self, workers, queue, method, retry_after=1):
+        self.workers = workers
+        self.queue = queue
+        self.method = method  # werkzeug method with its cost, e.g. pbkdf2:sha256:260000
+        self.stored_method = storedMethod(method)  # prefix of hashes made with method
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.calls = 0
+        self.rejected = 0
+        self.rehashes = 0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    # result of fn(*args), run in the pool when called from a request
+    def run(self, fn, *args):
+        self.calls += 1
+        if self.workers == 0 or not has_request_context():
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PasswordPoolBusy(self.retry_after)
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    # salted hash of password with the configured method
+    def hash(self, password):
+        return self.run(generate_password_hash, password, self.method)
+
+    # salted hashes of many passwords, spread over every pool worker as one call
+    def hashMany(self, passwords):
+        passwords = list(passwords)
+        if self.workers == 0 or not has_request_context() or len(passwords) < 2:
+            return [self.hash(password) for password in passwords]
+        self.calls += len(passwords)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PasswordPoolBusy(self.retry_after)
+        try:
+            chunk = max(1, len(passwords) // (4 * self.workers))
+            return list(self._pool().map(generate_password_hash, passwords, [self.method] * len(passwords), chunksize=chunk))
+        finally:
+            self._slots.release()
+
+    # True when password matches pwhash
+    def check(self, pwhash, password):
+        return self.run(check_password_hash, pwhash, password)
+
+    # True when pwhash was made with another method or cost than the configured one
+    def outdated(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.stored_method
+
+    # statistics as a dictionary, ready for API response
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue": self.queue,
+            "method": self.method,
+            "calls": self.calls,
+            "rejected": self.rejected,
+            "rehashes": self.rehashes
+        }
+
+
+password_pool = PasswordPool(app.config['PASSWORD_POOL_WORKERS'],
+                             app.config['PASSWORD_POOL_QUEUE'],
+                             app.config['PASSWORD_HASH_METHOD'],
+                             app.config['PASSWORD_RETRY_AFTER'])
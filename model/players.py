@@ -2,11 +2,15 @@
 from random import randrange
 from datetime import date
 import os, base64
+import bisect
 import json
+import threading
 
 from __init__ import app, db
+from model.passwords import password_pool
+from model.shared import VersionTracker, bumpVersions
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
-from werkzeug.security import generate_password_hash, check_password_hash
 
 
 ''' Tutorial: https://www.sqlalchemy.org/library.html#tutorials, try to get into Python shell and follow along '''
@@ -19,7 +23,7 @@ class Player(db.Model):
     _name = db.Column(db.String(255), unique=False, nullable=False)
     _uid = db.Column(db.String(255), unique=True, nullable=False)
     _password = db.Column(db.String(255), unique=False, nullable=False)
-    _tokens = db.Column(db.Integer)    
+    _tokens = db.Column(db.Integer, index=True)  # leaderboard order and rank counts
 
     # constructor of a Player object, initializes the instance variables within object (self)
     def __init__(self, name, uid, tokens, password="123qwerty"):
@@ -58,13 +62,17 @@ class Player(db.Model):
 
     # update password, this is conventional setter
     def set_password(self, password):
-        """Create a hashed password."""
-        self._password = generate_password_hash(password, method='sha256')
+        """Create a hashed password, in the password pool."""
+        self._password = password_pool.hash(password)
 
     # check password parameter versus stored/encrypted password
     def is_password(self, password):
-        """Check against hashed password."""
-        result = check_password_hash(self._password, password)
+        """Check against hashed password, a match made with an outdated method is rehashed."""
+        result = password_pool.check(self._password, password)
+        if result and password_pool.outdated(self._password):
+            self.set_password(password)
+            db.session.commit()
+            password_pool.rehashes += 1
         return result
     
     # dob property is returned as string, to avoid unfriendly outcomes
@@ -95,16 +103,27 @@ class Player(db.Model):
             db.session.remove()
             return None
 
+    # columns each read() field is built from, lets a query load only requested fields
+    read_columns = {
+        "id": ["id"],
+        "name": ["_name"],
+        "uid": ["_uid"],
+        "tokens": ["_tokens"],
+        "password": ["_password"]
+    }
+
     # CRUD read converts self to dictionary
+    # fields limits output to the named keys, others are never touched (or loaded)
     # returns dictionary
-    def read(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "uid": self.uid,
-            "tokens": self.tokens,
-            "password": self._password
+    def read(self, fields=None):
+        readers = {
+            "id": lambda: self.id,
+            "name": lambda: self.name,
+            "uid": lambda: self.uid,
+            "tokens": lambda: self.tokens,
+            "password": lambda: self._password
         }
+        return {key: reader() for key, reader in readers.items() if fields is None or key in fields}
 
     # CRUD update: updates name, uid, password, tokens
     # returns self
@@ -131,27 +150,171 @@ class Player(db.Model):
         return player
 
 
+"""Token Operations, each one conditional UPDATE of _tokens per player inside one transaction
+  the database adds the delta to the current value, so concurrent changes are never lost, and a balance
+  never goes below 0: a decrement or transfer that would overdraw changes nothing and raises
+"""
+ADD_TOKENS = "UPDATE players SET _tokens = COALESCE(_tokens, 0) + :delta WHERE _uid = :uid AND COALESCE(_tokens, 0) + :delta >= 0"
+
+
+# raised by a token operation that changed nothing, uids are the players it failed for
+class TokenError(ValueError):
+    def __init__(self, message, uids):
+        super().__init__(message)
+        self.uids = uids
+
+
+class UnknownPlayer(TokenError):
+    pass
+
+
+class InsufficientTokens(TokenError):
+    pass
+
+
+# rolls back, then raises the error explaining why deltas {uid: delta} could not be applied
+def _tokenFailure(deltas):
+    db.session.rollback()
+    balances = dict(db.session.query(Player._uid, db.func.coalesce(Player._tokens, 0)).filter(Player._uid.in_(list(deltas))))
+    unknown = [uid for uid in deltas if uid not in balances]
+    if unknown:
+        raise UnknownPlayer(f"Unknown players {', '.join(unknown)}", unknown)
+    short = [uid for uid, delta in deltas.items() if balances[uid] + delta < 0]
+    if not short:
+        raise TokenError("Tokens changed at the same time, try again", list(deltas))
+    raise InsufficientTokens(f"Not enough tokens: {', '.join(short)}", short)
+
+
+# add delta to the tokens of uid, negative to take tokens, returns the new balance
+def addTokens(uid, delta):
+    try:
+        tokens = db.session.execute(text(ADD_TOKENS + " RETURNING _tokens"), {"uid": uid, "delta": delta}).scalar()
+        if tokens is None:
+            _tokenFailure({uid: delta})
+        bumpVersions(db.session, Player.__tablename__)
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    return tokens
+
+
+# move amount tokens from source to target in one transaction, returns {uid: new balance} of both
+def transferTokens(source, target, amount):
+    if amount <= 0 or source == target:
+        raise TokenError("Transfer needs a positive amount and two different players", [source, target])
+    try:
+        debit = db.session.execute(text(ADD_TOKENS + " RETURNING _tokens"), {"uid": source, "delta": -amount}).scalar()
+        if debit is None:
+            _tokenFailure({source: -amount})
+        credit = db.session.execute(text(ADD_TOKENS + " RETURNING _tokens"), {"uid": target, "delta": amount}).scalar()
+        if credit is None:
+            _tokenFailure({target: amount})
+        bumpVersions(db.session, Player.__tablename__)
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    return {source: debit, target: credit}
+
+
+# apply (uid, delta) pairs in one executemany and one commit, all or nothing, returns players changed
+# -- deltas of the same uid are summed first
+def applyTokens(deltas):
+    totals = {}
+    for uid, delta in deltas:
+        totals[uid] = totals.get(uid, 0) + delta
+    if not totals:
+        return 0
+    try:
+        result = db.session.execute(text(ADD_TOKENS), [{"uid": uid, "delta": delta} for uid, delta in totals.items()])
+        if result.rowcount != len(totals):
+            _tokenFailure(totals)
+        bumpVersions(db.session, Player.__tablename__)
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    return len(totals)
+
+
+"""Leaderboard, players by tokens, most first, ties share a rank and are listed by id
+  a snapshot of the top LEADERBOARD_SIZE players is kept per worker process, it is rebuilt
+  after any change of the players table (by any worker, see model/shared.py), so a top-N is a slice of it
+  ranks below the snapshot count the players with more tokens in the _tokens index, a range of it
+"""
+class LeaderboardSnapshot:
+    def __init__(self, size):
+        rows = db.session.query(Player._uid, Player._name, db.func.coalesce(Player._tokens, 0)) \
+            .order_by(Player._tokens.desc(), Player.id).limit(size).all()
+        self.complete = len(rows) < size  # every player is in the snapshot
+        self.negated = [-tokens for _, _, tokens in rows]  # ascending, for bisect
+        self.rows = []
+        for position, (uid, name, tokens) in enumerate(rows):
+            rank = position + 1 if position == 0 or tokens != rows[position - 1][2] else self.rows[-1]["rank"]
+            self.rows.append({"rank": rank, "uid": uid, "name": name, "tokens": tokens})
+
+    # rank of a player with tokens, None when the snapshot can not tell
+    def rank(self, tokens):
+        if self.complete or (self.negated and -tokens <= self.negated[-1]):
+            return bisect.bisect_left(self.negated, -tokens) + 1
+        return None
+
+
+leaderboard = None
+leaderboard_lock = threading.Lock()  # one rebuild at a time
+leaderboard_version = VersionTracker('players')  # version of the players table the snapshot was built at
+
+
+# the current leaderboard snapshot, rebuilt when the players table changed
+def getLeaderboard():
+    global leaderboard
+    with leaderboard_lock:
+        if leaderboard_version.changed() or leaderboard is None:
+            leaderboard_version.mark()
+            leaderboard = LeaderboardSnapshot(app.config['LEADERBOARD_SIZE'])
+        return leaderboard
+
+
+# the n players with the most tokens, at most LEADERBOARD_SIZE, with their rank
+def topPlayers(n):
+    return getLeaderboard().rows[:n]
+
+
+# rank of uid, {"uid", "tokens", "rank"}, None when there is no such player
+def rankPlayer(uid):
+    snapshot = getLeaderboard()
+    tokens = db.session.query(db.func.coalesce(Player._tokens, 0)).filter(Player._uid == uid).scalar()
+    if tokens is None:
+        return None
+    rank = snapshot.rank(tokens)
+    if rank is None:
+        rank = db.session.query(db.func.count(Player.id)).filter(Player._tokens > tokens).scalar() + 1
+    return {"uid": uid, "tokens": tokens, "rank": rank}
+
+
 """Database Creation and Testing """
 
 
-# Builds working data for testing
+# Builds working data for testing, only players missing from the table are added, so only they are hashed
 def initPlayers():
     with app.app_context():
-        """Create database and tables"""
-        #db.create_all()
         """Tester records for table"""
-        players = [
-            Player(name='Azeem Khan', uid='azeemK', tokens=45),
-            Player(name='Ahad Biabani', uid='ahadB', tokens=41),
-            Player(name='Akshat Parikh', uid='akshatP', tokens=40),
-            Player(name='Josh Williams', uid='joshW', tokens=38)
+        testers = [
+            dict(name='Azeem Khan', uid='azeemK', tokens=45),
+            dict(name='Ahad Biabani', uid='ahadB', tokens=41),
+            dict(name='Akshat Parikh', uid='akshatP', tokens=40),
+            dict(name='Josh Williams', uid='joshW', tokens=38)
         ]
+        uids = [tester['uid'] for tester in testers]
+        existing = {uid for (uid,) in db.session.query(Player._uid).filter(Player._uid.in_(uids))}
+        players = [Player(**tester) for tester in testers if tester['uid'] not in existing]
 
-        """Builds sample user/note(s) data"""
-        for player in players:
-            try:
-                player.create()
-            except IntegrityError:
-                '''fails with bad or duplicate data'''
-                db.session.remove()
-                print(f"Records exist, duplicate email, or error: {player.uid}")
\ No newline at end of file
+        """Builds sample player data in one transaction"""
+        db.session.add_all(players)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            '''fails with bad or duplicate data'''
+            db.session.rollback()
+            print(f"Records exist, duplicate email, or error: {', '.join(player.uid for player in players)}")
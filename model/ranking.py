@@ -0,0 +1,113 @@
+""" incremental ranking of ids by a non-negative integer count """
+import heapq
+import threading
+
+
+# Ranking maintained as counts change, answering top-n and rank without scanning all ids
+# -- ids are kept in buckets by count, and a Fenwick tree over count values holds the bucket sizes
+# -- rank is the number of ids above a count, top-n walks the non-empty buckets from the highest count,
+#    each step found by a descent of the tree, so both are O(log max count) per step and never scan ids
+class RankIndex:
+    def __init__(self, counts=None):
+        self._lock = threading.Lock()
+        self.rebuild(counts or {})
+
+    # replace all counts, O(n)
+    def rebuild(self, counts):
+        with self._lock:
+            self.counts = dict(counts)
+            self.buckets = {}
+            for id, count in self.counts.items():
+                self.buckets.setdefault(count, set()).add(id)
+            size = 64
+            while size <= max(self.counts.values(), default=0):
+                size *= 2
+            self._buildTree(size)
+
+    # Fenwick tree of ids per count value at index count + 1, size a power of two
+    def _buildTree(self, size):
+        tree = [0] * (size + 1)
+        for count, bucket in self.buckets.items():
+            tree[count + 1] += len(bucket)
+        for index in range(1, size + 1):  # linear time construction
+            parent = index + (index & -index)
+            if parent <= size:
+                tree[parent] += tree[index]
+        self.tree = tree
+
+    def _treeAdd(self, count, delta):
+        index = count + 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    # number of ids with a count of at most count
+    def _treeCount(self, count):
+        index = min(count + 1, len(self.tree) - 1)
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    # smallest count with at least order ids at or below it, i.e. the count of the order-th lowest id
+    def _treeFind(self, order):
+        index = 0
+        step = (len(self.tree) - 1)
+        while step:
+            if index + step < len(self.tree) and self.tree[index + step] < order:
+                index += step
+                order -= self.tree[index]
+            step //= 2
+        return index  # tree index index + 1 holds count index
+
+    # set the count of id, O(log max count)
+    def set(self, id, count):
+        with self._lock:
+            old = self.counts.get(id)
+            if old == count:
+                return
+            if old is not None:
+                bucket = self.buckets[old]
+                bucket.discard(id)
+                if not bucket:
+                    del self.buckets[old]
+                self._treeAdd(old, -1)
+            self.counts[id] = count
+            self.buckets.setdefault(count, set()).add(id)
+            size = len(self.tree) - 1
+            if count < size:
+                self._treeAdd(count, 1)
+            else:  # count outgrew the tree, double it, amortized O(1) per change
+                while size <= count:
+                    size *= 2
+                self._buildTree(size)
+
+    # count of id, None when unknown
+    def get(self, id):
+        return self.counts.get(id)
+
+    # up to n (id, count) pairs with the highest counts above minimum, ties by lower id
+    def top(self, n, minimum=0):
+        with self._lock:
+            found = []
+            below = len(self.counts)  # ids at or below the next count to visit
+            while len(found) < n and below > 0:
+                count = self._treeFind(below)
+                if count <= minimum:
+                    break
+                bucket = self.buckets[count]
+                found.extend((id, count) for id in heapq.nsmallest(n - len(found), bucket))
+                below -= len(bucket)
+            return found
+
+    # 1 + number of ids with a greater count, None when id is unknown
+    def rank(self, id):
+        with self._lock:
+            count = self.counts.get(id)
+            if count is None:
+                return None
+            return 1 + len(self.counts) - self._treeCount(count)
+
+    def __len__(self):
+        return len(self.counts)
@@ -0,0 +1,117 @@
+""" state shared by worker processes, a version per table kept in the database
+
+Every committed transaction that changes a table bumps its version once, ORM flushes are tracked by the session
+events below and Core or raw SQL writes call bumpVersions(). A worker process keeps copies of table data
+(indexes, caches, vote totals) and compares the version it copied at with the current one, so a change made
+by any worker, or before a restart, is noticed with one primary key lookup.
+"""
+import random
+import threading
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session, scoped_session
+
+from __init__ import db
+
+
+# Version of each table, one row per table name, missing rows are version 0
+class TableVersion(db.Model):
+    __tablename__ = 'versions'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+# a random epoch row is stamped when the table is created, versions of a recreated database never repeat old ones
+@event.listens_for(TableVersion.__table__, 'after_create')
+def _stampEpoch(target, connection, **kw):
+    connection.execute(target.insert(), {"name": "epoch", "version": random.randrange(1, 1 << 31)})
+
+
+BUMP = text("INSERT INTO versions (name, version) VALUES (:name, 1) "
+            "ON CONFLICT (name) DO UPDATE SET version = version + 1")
+
+
+# bump the versions of table names in the transaction of connection, a session or a connection
+# -- a session bumps each table at most once per transaction, so one commit is always one version
+def bumpVersions(connection, *names):
+    if isinstance(connection, scoped_session):
+        connection = connection()
+    if isinstance(connection, Session):
+        bumped = connection.info.setdefault('bumped_versions', set())
+        names = [name for name in names if name not in bumped]
+        bumped.update(names)
+    if names:
+        connection.execute(BUMP, [{"name": name} for name in names])
+
+
+# {name: version} of table names, one SELECT on connection, db.session when None
+def tableVersions(names, connection=None):
+    connection = db.session if connection is None else connection
+    rows = connection.execute(text("SELECT name, version FROM versions WHERE name IN :names")
+                              .bindparams(db.bindparam('names', expanding=True)), {"names": list(names)})
+    versions = dict.fromkeys(names, 0)
+    versions.update((name, version) for name, version in rows)
+    return versions
+
+
+# version of one table name
+def tableVersion(name, connection=None):
+    return tableVersions([name], connection)[name]
+
+
+# tables changed by an ORM flush are bumped in the same transaction
+@event.listens_for(Session, 'after_flush')
+def _bumpFlushed(session, flush_context):
+    objects = list(session.new) + list(session.deleted) + [obj for obj in session.dirty if session.is_modified(obj)]
+    names = {inspect(obj).mapper.local_table.name for obj in objects}
+    names.discard(TableVersion.__tablename__)
+    if names:
+        bumpVersions(session, *sorted(names))
+
+
+# functions called with the set of table names of each commit that changed tables, in the committing process
+commit_listeners = []
+
+
+@event.listens_for(Session, 'after_commit')
+def _committed(session):
+    names = session.info.pop('bumped_versions', None)
+    if names:
+        for listener in commit_listeners:
+            listener(names)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _resetBumped(session):
+    session.info.pop('bumped_versions', None)
+
+
+# The version of a table a process copy was made at
+# -- changed() reads the current version, mark() records it once the copy is rebuilt, read before the rows
+#    so a change committed while rebuilding is seen again rather than missed
+# -- advance() after a change of this process committed: exactly one newer version means no other worker
+#    changed the table, the copy updated in place stays current
+class VersionTracker:
+    def __init__(self, name):
+        self.name = name
+        self.seen = None  # version of the copy, None before the first build
+        self.current = None  # version read by the last changed()
+        self._lock = threading.Lock()
+
+    # True when the table changed since mark()
+    def changed(self):
+        current = tableVersion(self.name)
+        with self._lock:
+            self.current = current
+            return current != self.seen
+
+    def mark(self):
+        with self._lock:
+            self.seen = self.current
+
+    def advance(self):
+        current = tableVersion(self.name)
+        with self._lock:
+            if self.seen is not None and current == self.seen + 1:
+                self.seen = current
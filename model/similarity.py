@@ -0,0 +1,208 @@
+""" ingredient similarity of clients, top-k neighbours over a sparse product x ingredient matrix """
+import threading
+
+import numpy as np
+
+from model.ingredients import ingredientTokens
+
+
+# Most similar products by shared ingredients, cosine or jaccard of binary ingredient vectors
+# -- the product x ingredient matrix is kept as posting lists of rows per ingredient, and ingredients found in
+#    at least a tenth of the products are also dense columns: the overlaps of a block of products with every
+#    product are one matrix product over the dense columns plus one bincount over the rare postings
+# -- neighbours is a table of the max_k best rows of each product, filled in blocks by precompute() or on demand
+# -- a new product is scored against all others once, its own row is filled and it is inserted into the rows
+#    it beats, a removed product only invalidates the rows that listed it
+class SimilarityIndex:
+    def __init__(self, metric='cosine', max_k=20, block_bytes=1 << 24):
+        if metric not in ('cosine', 'jaccard'):
+            raise ValueError(f"unknown metric {metric}")
+        self.metric = metric
+        self.max_k = max_k
+        self.block_bytes = block_bytes  # memory for the scores of one block of products
+        self._lock = threading.RLock()
+        self.invalidate()
+
+    # forget all products, the next use rebuilds them
+    def invalidate(self):
+        with self._lock:
+            self.built = False
+            self.n = 0  # rows used, removed products keep their row
+            self.rows = {}  # id -> row
+            self.ids = np.zeros(0, dtype=np.int64)
+            self.sizes = np.zeros(0, dtype=np.float32)  # ingredients per row, 0 once removed
+            self.computed = np.zeros(0, dtype=bool)  # neighbours of row are current
+            self.neighbours = np.full((0, self.max_k), -1, dtype=np.int32)  # rows, best first, -1 pads
+            self.scores = np.zeros((0, self.max_k), dtype=np.float32)
+            self.columns = {}  # ingredient token -> column
+            self.row_columns = []  # row -> columns of its ingredients
+            self.postings = []  # column -> rows with the ingredient
+            self._posting_arrays = {}  # column -> postings as an array, dropped when the postings change
+            self.dense_columns = {}  # column -> index in dense
+            self.dense = np.zeros((0, 0), dtype=np.float32)
+
+    # replace all products from (id, ingredients) rows, neighbours are computed later
+    def rebuild(self, rows):
+        with self._lock:
+            self.invalidate()
+            for id, ingredients in rows:
+                self._append(id, ingredientTokens(ingredients))
+            common = [column for column, posting in enumerate(self.postings) if len(posting) * 10 >= self.n]
+            self.dense_columns = {column: index for index, column in enumerate(common)}
+            self.dense = np.zeros((len(self.ids), len(common)), dtype=np.float32)
+            for column, index in self.dense_columns.items():
+                self.dense[self.postings[column], index] = 1.0
+            self.built = True
+
+    # room for at least size rows, capacity doubles so appends are amortized O(1)
+    def _reserve(self, size):
+        capacity = len(self.ids)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 64)
+        grow = lambda array, fill: np.concatenate([array, np.full((capacity - len(array),) + array.shape[1:], fill, dtype=array.dtype)])
+        self.ids = grow(self.ids, 0)
+        self.sizes = grow(self.sizes, 0)
+        self.computed = grow(self.computed, False)
+        self.neighbours = grow(self.neighbours, -1)
+        self.scores = grow(self.scores, 0)
+        self.dense = grow(self.dense, 0)
+
+    # add a row for id with ingredient tokens, returns the row
+    def _append(self, id, tokens):
+        row = self.n
+        self._reserve(row + 1)
+        self.n += 1
+        self.rows[id] = row
+        self.ids[row] = id
+        self.sizes[row] = len(tokens)
+        columns = []
+        for token in tokens:
+            column = self.columns.get(token)
+            if column is None:
+                column = self.columns[token] = len(self.postings)
+                self.postings.append([])
+            self.postings[column].append(row)
+            self._posting_arrays.pop(column, None)
+            if column in self.dense_columns:
+                self.dense[row, self.dense_columns[column]] = 1.0
+            columns.append(column)
+        self.row_columns.append(np.array(columns, dtype=np.int64))
+        return row
+
+    def _posting(self, column):
+        array = self._posting_arrays.get(column)
+        if array is None:
+            array = self._posting_arrays[column] = np.array(self.postings[column], dtype=np.int64)
+        return array
+
+    # similarity of each of rows with every row, a len(rows) x n array, 0 for itself and removed rows
+    def _similarity(self, rows):
+        n = self.n
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.dense_columns:
+            overlap = self.dense[rows] @ self.dense[:n].T
+        else:
+            overlap = np.zeros((len(rows), n), dtype=np.float32)
+        owners, candidates = [], []
+        for block_row, row in enumerate(rows):
+            for column in self.row_columns[row]:
+                if column not in self.dense_columns:
+                    posting = self._posting(column)
+                    candidates.append(posting)
+                    owners.append(np.full(len(posting), block_row, dtype=np.int64))
+        if candidates:
+            pairs = np.concatenate(owners) * n + np.concatenate(candidates)
+            overlap += np.bincount(pairs, minlength=len(rows) * n).reshape(len(rows), n)
+        sizes = self.sizes[:n]
+        own = sizes[rows][:, None]
+        if self.metric == 'cosine':
+            denominator = np.sqrt(own * sizes[None, :])
+        else:
+            denominator = own + sizes[None, :] - overlap
+        similarity = np.divide(overlap, denominator, out=np.zeros_like(overlap), where=denominator > 0)
+        similarity[np.arange(len(rows)), rows] = 0.0
+        return similarity
+
+    # fill the neighbours of rows, best first, equal scores of the kept rows in id order
+    def _compute(self, rows, similarity=None):
+        if similarity is None:
+            similarity = self._similarity(rows)
+        k = min(self.max_k, self.n)
+        best = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(similarity, best, axis=1)
+        order = np.lexsort((self.ids[best], -best_scores), axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best[best_scores <= 0] = -1
+        self.neighbours[rows] = -1
+        self.scores[rows] = 0.0
+        self.neighbours[rows, :k] = best
+        self.scores[rows, :k] = np.maximum(best_scores, 0)
+        self.computed[rows] = True
+
+    # fill every missing row of the neighbour table, a block of rows at a time
+    def precompute(self):
+        while True:
+            with self._lock:
+                missing = np.flatnonzero(~self.computed[:self.n] & (self.sizes[:self.n] > 0))
+                if len(missing) == 0:
+                    return
+                block = max(1, self.block_bytes // (8 * self.n))  # similarity and overlap of the block
+                self._compute(missing[:block])
+
+    # up to k (id, score) pairs most similar to id, best first, None when id is unknown
+    def similar(self, id, k):
+        with self._lock:
+            row = self.rows.get(id)
+            if row is None:
+                return None
+            if not self.computed[row]:
+                self._compute([row])
+            return [(int(self.ids[other]), float(score))
+                    for other, score in zip(self.neighbours[row, :k], self.scores[row, :k]) if other >= 0]
+
+    # index a new or changed product, ignored until the index is built
+    def add(self, id, ingredients):
+        with self._lock:
+            if not self.built:
+                return
+            self._remove(id)
+            row = self._append(id, ingredientTokens(ingredients))
+            similarity = self._similarity([row])
+            self._compute([row], similarity)
+            # insert row into every computed row it beats, one vectorized merge
+            similarity = similarity[0]
+            beaten = np.flatnonzero(self.computed[:self.n] & (similarity > self.scores[:self.n, -1]))
+            beaten = beaten[beaten != row]
+            if len(beaten) == 0:
+                return
+            neighbours = np.concatenate([self.neighbours[beaten], np.full((len(beaten), 1), row, dtype=np.int32)], axis=1)
+            scores = np.concatenate([self.scores[beaten], similarity[beaten, None]], axis=1)
+            ids = np.where(neighbours >= 0, self.ids[neighbours], np.iinfo(np.int64).max)
+            order = np.lexsort((ids, -scores), axis=1)[:, :self.max_k]
+            self.neighbours[beaten] = np.take_along_axis(neighbours, order, axis=1)
+            self.scores[beaten] = np.take_along_axis(scores, order, axis=1)
+
+    def _remove(self, id):
+        row = self.rows.pop(id, None)
+        if row is None:
+            return
+        for column in self.row_columns[row]:
+            self.postings[column].remove(row)
+            self._posting_arrays.pop(column, None)
+        self.row_columns[row] = np.zeros(0, dtype=np.int64)
+        self.sizes[row] = 0
+        self.dense[row] = 0
+        self.computed[row] = False
+        listed = (self.neighbours[:self.n] == row).any(axis=1)
+        self.computed[:self.n][listed] = False  # recomputed on next use
+
+    # drop a deleted product, ignored until the index is built
+    def remove(self, id):
+        with self._lock:
+            if self.built:
+                self._remove(id)
+
+    def __len__(self):
+        return len(self.rows)
@@ -1,10 +1,11 @@
 """ database dependencies to support sqliteDB examples """
-from random import randrange
 from datetime import date
 import os, base64
 import json
 
 from __init__ import app, db
+from model.cache import LRUCache
+from model.shared import VersionTracker
 from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -76,7 +77,7 @@ class SkinType(db.Model):
 
     # Define the SkinType schema with "vars" from object
     id = db.Column(db.Integer, primary_key=True)
-    _skin_type = db.Column(db.String(255), unique=False, nullable=False)
+    _skin_type = db.Column(db.String(255), unique=False, nullable=False, index=True)  # routine lookup by skin type
     _moisturizer = db.Column(db.String(255), unique=False, nullable=False)
     _face_cleanser = db.Column(db.String(255), unique=False, nullable=False)
     _serum = db.Column(db.String(255), unique=False, nullable=False)
@@ -159,28 +160,42 @@ class SkinType(db.Model):
             # creates a person object from SkinType(db.Model) class, passes initializers
             db.session.add(self)  # add prepares to persist person object to skin_types table
             db.session.commit()  # SqlAlchemy "unit of work pattern" requires a manual commit
+            routine_cache.delete(self._skin_type)
             return self
         except IntegrityError:
             db.session.remove()
             return None
 
+    # columns each read() field is built from, lets a query load only requested fields
+    read_columns = {
+        "id": ["id"],
+        "skin_type": ["_skin_type"],
+        "moisturizer": ["_moisturizer"],
+        "face_cleanser": ["_face_cleanser"],
+        "serum": ["_serum"],
+        "sunscreen": ["_sunscreen"]
+    }
+
     # CRUD read converts self to dictionary
+    # fields limits output to the named keys, others are never touched (or loaded)
     # returns dictionary
-    def read(self):
-        return {
-            "id": self.id,
-            "skin_type": self._skin_type,
-            "moisturizer": self._moisturizer,
-            "face_cleanser": self._face_cleanser,
-            "serum": self._serum,
-            "sunscreen": self._sunscreen,
-            #"kosts": [kost.read() for kost in self.kosts]
+    def read(self, fields=None):
+        readers = {
+            "id": lambda: self.id,
+            "skin_type": lambda: self._skin_type,
+            "moisturizer": lambda: self._moisturizer,
+            "face_cleanser": lambda: self._face_cleanser,
+            "serum": lambda: self._serum,
+            "sunscreen": lambda: self._sunscreen,
+            #"kosts": lambda: [kost.read() for kost in self.kosts]
         }
+        return {key: reader() for key, reader in readers.items() if fields is None or key in fields}
 
     # CRUD update: updates skin_type and matching skin products
     # returns self
     def update(self, skin_type="", moisturizer="", face_cleanser="", serum="", sunscreen=""):
         """only updates values with length"""
+        routine_cache.delete(self._skin_type)  # cached under the old skin type
         if len(skin_type) > 0:
             self._skin_type = skin_type
         if len(moisturizer) > 0:
@@ -192,44 +207,63 @@ class SkinType(db.Model):
         if len(sunscreen) > 0:
             self._sunscreen = sunscreen
         db.session.commit()
+        routine_cache.delete(self._skin_type)
         return self
 
     # CRUD delete: remove self
     # None
     def delete(self):
+        skin_type = self._skin_type
         db.session.delete(self)
         db.session.commit()
+        routine_cache.delete(skin_type)
         return None
 
 
-"""Database Creation and Testing """
+"""Routine Cache, serialized routines by skin type, read through to the _skin_type index
+  entries are dropped by SkinType create, update and delete, so a cached routine is never stale in this process
+  every entry is dropped once another worker changed the skintypes table, see model/shared.py
+"""
+routine_cache = LRUCache(app.config['SKINTYPE_CACHE_BYTES'])
+routine_version = VersionTracker('skintypes')  # version of the skintypes table the cache holds
+
+
+# JSON list of the routines of skin_type, as bytes ready for a response, None when there are none
+def getRoutines(skin_type):
+    if routine_version.changed():
+        routine_cache.clear()
+        routine_version.mark()
+    body = routine_cache.get(skin_type)
+    if body is None:
+        routines = SkinType.query.filter(SkinType._skin_type == skin_type).order_by(SkinType.id).all()
+        if not routines:
+            return None
+        body = json.dumps([routine.read() for routine in routines], separators=(',', ':')).encode('utf-8')
+        routine_cache.set(skin_type, body, len(body))
+    return body
 
 
-# Builds working data for testing
+"""Database Creation and Testing """
+
 
+# Builds working data for testing, only skin types missing from the table are added
 def initSkinTypes():
     with app.app_context():
-        """Create database and tables"""
-        #db.create_all()
         """Tester data for table"""
         st1 = SkinType(skin_type='oily',      moisturizer='SkinCeuticals Daily Moisture',           face_cleanser='CeraVe Acne Foaming Cream Cleanser',                               serum='The Ordinary Niacinamide 10% + Zinc 1% Serum', sunscreen='Regaliz Truderma Sunscreen Gel SPF 50')
         st2 = SkinType(skin_type='dry',       moisturizer='Neutrogena Hydro Boost Gel Moisturizer', face_cleanser='Paula\'s Choice Perfectly Balanced Foaming Cleanser',              serum='Simple Booster Serum - 3% Hyaluronic Acid',    sunscreen='Laneige Watery Sun Cream')
         st3 = SkinType(skin_type='sensitive', moisturizer='Plum Hello Aloe Caring Day Moisturizer', face_cleanser='Bioderma Sensibio Gentle Soothing Micellar Cleansing Foaming Gel', serum='Simple Booster Serum - 10% Niacinamide',       sunscreen='Elta MD Skin Care UV Glow SPF 36')
         st4 = SkinType(skin_type='normal',    moisturizer='Good Vibes Gel Moisturizer',             face_cleanser='La Roche-Posay Toleriane Hydrating Gentle Cleanser',               serum='Jovees Herbal Vitamin C Face Serum',           sunscreen='Cetaphil Daily Oil Free Facial Moisturizer with SPF 35')
 
-        skintypes = [st1, st2, st3, st4]
-
-        """Builds sample skin type/note(s) data"""
-        for skintype in skintypes:
-            try:
-                '''add a few 1 to 4 notes per skin type'''
-                for num in range(randrange(1, 4)):
-                    note = "#### " + skintype.skin_type + " note " + str(num) + ". \n Generated by test data."
-                    #skintype.kosts.append(Kost(id=skintype.id, note=note, image='ncs_logo.png'))
-                    #'''add skin type/kost data to table'''
-                    skintype.create()
-            except IntegrityError:
-                '''fails with bad or duplicate data'''
-                db.session.remove()
-                print(f"Records exist, duplicate email, or error: {skintype.skin_type}")
-            
\ No newline at end of file
+        existing = {skin_type for (skin_type,) in db.session.query(SkinType._skin_type)}
+        skintypes = [skintype for skintype in [st1, st2, st3, st4] if skintype.skin_type not in existing]
+
+        """Builds sample skin type data in one transaction"""
+        db.session.add_all(skintypes)
+        try:
+            db.session.commit()
+            routine_cache.clear()
+        except IntegrityError:
+            '''fails with bad or duplicate data'''
+            db.session.rollback()
+            print(f"Records exist, duplicate email, or error: {', '.join(skintype.skin_type for skintype in skintypes)}")
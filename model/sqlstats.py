@@ -0,0 +1,44 @@
+""" per request SQL statistics, exposed in debug response headers """
+import time
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# cursor events fire for every engine, statements outside of a request are not counted
+# -- the start time is kept on the statement's execution context, dropped with it when the statement raises
+#    and after_cursor_execute never fires
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_query_start', None)
+    if start is not None and has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_time = g.get('query_time', 0.0) + time.perf_counter() - start
+
+
+# number of SQL statements executed by the current request
+def queryCount():
+    return g.get('query_count', 0) if has_request_context() else 0
+
+
+# seconds spent executing SQL statements in the current request
+def queryTime():
+    return g.get('query_time', 0.0) if has_request_context() else 0.0
+
+
+# adds X-Query-Count and X-Query-Time headers to responses
+# -- enabled in debug mode or with app.config['QUERY_DEBUG_HEADERS']
+def initQueryStats(app):
+    @app.after_request
+    def query_headers(response):
+        if app.debug or app.config.get('QUERY_DEBUG_HEADERS'):
+            response.headers['X-Query-Count'] = str(queryCount())
+            response.headers['X-Query-Time'] = f'{queryTime() * 1000:.3f}ms'
+        return response
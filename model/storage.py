@@ -0,0 +1,49 @@
+""" SQLite storage profiles, connection pragmas and pool sizing selected by STORAGE_PROFILE """
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+# Pragmas set on every new SQLite connection, by profile
+# -- compat keeps SQLite defaults: rollback journal, synchronous FULL, one connection per checkout
+# -- concurrent lets readers run while one worker writes: WAL journal, synchronous NORMAL (durable at checkpoints,
+#    never corrupt), a 64MiB page cache, 256MiB of memory mapped reads, and writers wait up to 5s for the lock
+storage_profiles = {
+    "compat": {},
+    "concurrent": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,  # KiB when negative
+        "mmap_size": 256 * 1024 * 1024,
+        "busy_timeout": 5000,  # ms
+        "temp_store": "MEMORY"
+    }
+}
+
+
+# Apply STORAGE_PROFILE of app, must run before db.init_app so engine options are in place
+# -- profiles with pragmas keep DB_POOL_SIZE open connections per worker process, so pragmas run once per
+#    connection instead of once per request, a pool connection may be used by any request thread
+def initStorage(app):
+    profile = app.config['STORAGE_PROFILE']
+    if profile not in storage_profiles:
+        raise ValueError(f"Unknown STORAGE_PROFILE {profile}, choose from {', '.join(storage_profiles)}")
+    pragmas = storage_profiles[profile]
+    if not pragmas or not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    options.setdefault('poolclass', QueuePool)
+    options.setdefault('pool_size', app.config['DB_POOL_SIZE'])
+    options.setdefault('max_overflow', app.config['DB_POOL_OVERFLOW'])
+    options.setdefault('connect_args', {}).setdefault('check_same_thread', False)
+
+    @event.listens_for(Engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
@@ -5,8 +5,10 @@ import os, base64
 import json
 
 from __init__ import app, db
+from model.auth import revokeUser
+from model.passwords import password_pool
+from model.images import imagePayload
 from sqlalchemy.exc import IntegrityError
-from werkzeug.security import generate_password_hash, check_password_hash
 
 
 ''' Tutorial: https://www.sqlalchemy.org/library.html#tutorials, try to get into Python shell and follow along '''
@@ -46,21 +48,15 @@ class Post(db.Model):
             return None
 
     # CRUD read, returns dictionary representation of Notes object
+    # image is a cached URL reference, or base64 text when inline is requested
     # returns dictionary
-    def read(self):
-        # encode image
-        path = app.config['UPLOAD_FOLDER']
-        file = os.path.join(path, self.image)
-        file_text = open(file, 'rb')
-        file_read = file_text.read()
-        file_encode = base64.encodebytes(file_read)
-        
+    def read(self, inline=None):
         return {
             "id": self.id,
             "userID": self.userID,
             "note": self.note,
             "image": self.image,
-            "base64": str(file_encode)
+            **imagePayload(self.image, inline)
         }
 
 
@@ -119,13 +115,17 @@ class User(db.Model):
 
     # update password, this is conventional setter
     def set_password(self, password):
-        """Create a hashed password."""
-        self._password = generate_password_hash(password, method='sha256')
+        """Create a hashed password, in the password pool."""
+        self._password = password_pool.hash(password)
 
     # check password parameter versus stored/encrypted password
     def is_password(self, password):
-        """Check against hashed password."""
-        result = check_password_hash(self._password, password)
+        """Check against hashed password, a match made with an outdated method is rehashed."""
+        result = password_pool.check(self._password, password)
+        if result and password_pool.outdated(self._password):
+            self.set_password(password)
+            db.session.commit()
+            password_pool.rehashes += 1
         return result
     
     # dob property is returned as string, to avoid unfriendly outcomes
@@ -161,17 +161,29 @@ class User(db.Model):
             db.session.remove()
             return None
 
-    # CRUD read converts self to dictionary
+    # columns or relationship each read() field is built from, lets a query load only requested fields
+    read_columns = {
+        "id": ["id"],
+        "name": ["_name"],
+        "uid": ["_uid"],
+        "dob": ["_dob"],
+        "age": ["_dob"],
+        "posts": ["posts"]
+    }
+
+    # CRUD read converts self to dictionary, inline is passed on to child notes
+    # fields limits output to the named keys, others are never touched (or loaded)
     # returns dictionary
-    def read(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "uid": self.uid,
-            "dob": self.dob,
-            "age": self.age,
-            "posts": [post.read() for post in self.posts]
+    def read(self, inline=None, fields=None):
+        readers = {
+            "id": lambda: self.id,
+            "name": lambda: self.name,
+            "uid": lambda: self.uid,
+            "dob": lambda: self.dob,
+            "age": lambda: self.age,
+            "posts": lambda: [post.read(inline) for post in self.posts]
         }
+        return {key: reader() for key, reader in readers.items() if fields is None or key in fields}
 
     # CRUD update: updates user name, password, phone
     # returns self
@@ -184,6 +196,8 @@ class User(db.Model):
         if len(password) > 0:
             self.set_password(password)
         db.session.commit()
+        if len(password) > 0:
+            revokeUser(self._uid)  # tokens issued with the old password
         return self
 
     # CRUD delete: remove self
@@ -191,37 +205,39 @@ class User(db.Model):
     def delete(self):
         db.session.delete(self)
         db.session.commit()
+        revokeUser(self._uid)
         return None
 
 
 """Database Creation and Testing """
 
 
-# Builds working data for testing
+# Builds working data for testing, only users missing from the table are added, so only they are hashed
 def initUsers():
     with app.app_context():
-        """Create database and tables"""
-        #db.create_all()
         """Tester data for table"""
-        u1 = User(name='Thomas Edison', uid='toby', password='123toby', dob=date(1847, 2, 11))
-        u2 = User(name='Nicholas Tesla', uid='niko', password='123niko')
-        u3 = User(name='Alexander Graham Bell', uid='lex', password='123lex')
-        u4 = User(name='Eli Whitney', uid='whit', password='123whit')
-        u5 = User(name='John Mortensen', uid='jm1021', dob=date(1959, 10, 21))
-
-        users = [u1, u2, u3, u4, u5]
+        testers = [
+            dict(name='Thomas Edison', uid='toby', password='123toby', dob=date(1847, 2, 11)),
+            dict(name='Nicholas Tesla', uid='niko', password='123niko'),
+            dict(name='Alexander Graham Bell', uid='lex', password='123lex'),
+            dict(name='Eli Whitney', uid='whit', password='123whit'),
+            dict(name='John Mortensen', uid='jm1021', dob=date(1959, 10, 21))
+        ]
+        uids = [tester['uid'] for tester in testers]
+        existing = {uid for (uid,) in db.session.query(User._uid).filter(User._uid.in_(uids))}
+        users = [User(**tester) for tester in testers if tester['uid'] not in existing]
 
         """Builds sample user/note(s) data"""
         for user in users:
-            try:
-                '''add a few 1 to 4 notes per user'''
-                for num in range(randrange(1, 4)):
-                    note = "#### " + user.name + " note " + str(num) + ". \n Generated by test data."
-                    user.posts.append(Post(id=user.id, note=note, image='ncs_logo.png'))
-                '''add user/post data to table'''
-                user.create()
-            except IntegrityError:
-                '''fails with bad or duplicate data'''
-                db.session.remove()
-                print(f"Records exist, duplicate email, or error: {user.uid}")
-            
\ No newline at end of file
+            '''add a few 1 to 4 notes per user'''
+            for num in range(randrange(1, 4)):
+                note = "#### " + user.name + " note " + str(num) + ". \n Generated by test data."
+                user.posts.append(Post(id=user.id, note=note, image='ncs_logo.png'))
+        '''add user/post data to table in one transaction'''
+        db.session.add_all(users)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            '''fails with bad or duplicate data'''
+            db.session.rollback()
+            print(f"Records exist, duplicate email, or error: {', '.join(user.uid for user in users)}")